@@ -0,0 +1,96 @@
+import logging
+from datetime import datetime, timedelta
+from dateutil import parser
+
+from market_data.spot_prices import get_spot_price, get_spot_price_batch
+from model_openai.openai_llm import OpenAILLM
+from plan_and_execute.plan_and_execute_agent import PlanAndExecuteAgent
+from tool_use.llm_tool import convert_to_llm_tool as llm_tool
+
+
+def calculate_price_growth_func(start_price: str, end_price: str) -> str:
+    """
+    Calculate the growth rate between two prices.
+
+    Parameters:
+    start_price (float): The starting price.
+    end_price (float): The ending price.
+
+    Returns:
+    str: Message containing the growth rate between the two prices
+    """
+    # Sometimes it is better to handle parsing in the function so you can return a meaningful error
+    try:
+        start_price_num = float(start_price)
+        end_price_num = float(end_price)
+    except Exception:
+        raise ValueError(
+            "Both start_price and end_price must be numbers. Call calculate_price_growth_func again, once you have the actual prices."
+        )
+    if start_price_num == 0:
+        start_price_num = 1 / float("inf")
+    ret = (end_price_num - start_price_num) / start_price_num
+    # Sometimes more humanised responses result in more accurate answers
+    return (
+        f"The growth rate between {start_price_num} and {end_price_num} is {ret:.4f}."
+    )
+
+
+def get_spot_price_func(ticker_symbol: str, date: str) -> float:
+    """
+    Get the market close price for a given ticker symbol and date.
+
+    Parameters:
+    ticker_symbol (str): the ticker symbol of the asset
+    date (datetime.date): the date for which the price is required
+
+    Returns:
+    float: the market close price
+    """
+    # Sometimes it is better to handle parsing in the function
+    date_converted = parser.parse(date)
+    return get_spot_price(ticker_symbol, date_converted)
+
+
+def get_spot_price_batch_func(arguments_list: list[dict]) -> list:
+    # Same results as get_spot_price_func, but all calls share one download
+    return get_spot_price_batch(arguments_list)
+
+
+def run_plan_and_execute_agent():
+    """
+    Run the plan and execute agent to showcase planning all tool calls upfront and running them in parallel.
+
+    Parameters:
+    None
+
+    Returns:
+    None
+    """
+    llm = OpenAILLM(
+        "meta-llama/llama-3.3-70b-instruct/fp-16", "https://api.inference.net/v1"
+    )
+    llm_tools = [
+        # Prices plainly as numbers, so plan steps can pass them on to the growth calculation
+        llm_tool(get_spot_price_func, batch_function=get_spot_price_batch_func),
+        llm_tool(calculate_price_growth_func),
+    ]
+    agent = PlanAndExecuteAgent(llm, llm_tools)
+
+    last_wednesday = datetime.now() - timedelta(
+        days=(datetime.now().weekday() + 4) % 7 + 7
+    )
+    last_wednesday_before = datetime.now() - timedelta(
+        days=(datetime.now().weekday() + 4) % 7 + 14
+    )
+    user_prompt = f"Was the price growth rate between {last_wednesday_before.date()} and {last_wednesday.date()} higher for NVDA or PLTR?"
+
+    response = agent.generate(user_prompt)
+    logging.info("The response is:")
+    logging.info(response)
+
+
+# Press the green button in the gutter to run the script.
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    run_plan_and_execute_agent()
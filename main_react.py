@@ -1,8 +1,10 @@
 import logging
 from datetime import datetime, timedelta
-import yfinance as yf
 from dateutil import parser
 
+from market_data.spot_prices import get_spot_price, get_spot_price_batch
+from model.cascade_llm import CascadeLLM
+from model.tiered_cache import TieredCache
 from model_openai.openai_llm import OpenAILLM
 from reason_and_act.react_agent import ReactAgent
 from tool_use.llm_tool import convert_to_llm_tool as llm_tool
@@ -36,6 +38,11 @@ def calculate_price_growth_func(start_price: str, end_price: str) -> str:
     )
 
 
+def format_spot_price(ticker_symbol: str, date: datetime, price: float) -> str:
+    # Sometimes more humanised responses result in more accurate answers
+    return f"The market close price for {ticker_symbol} on {date.strftime('%Y-%m-%d')} is {price:.4f}."
+
+
 def get_spot_price_func(ticker_symbol: str, date: str) -> str:
     """
     Get the market close price for a given ticker symbol and date.
@@ -50,15 +57,12 @@ def get_spot_price_func(ticker_symbol: str, date: str) -> str:
     # Sometimes it is better to handle parsing in the function
     date_converted = parser.parse(date)
     ret = get_spot_price(ticker_symbol, date_converted)
-    # Sometimes more humanised responses result in more accurate answers
-    return f"The market close price for {ticker_symbol} on {date_converted.strftime('%Y-%m-%d')} is {ret:.4f}."
+    return format_spot_price(ticker_symbol, date_converted, ret)
 
 
-def get_spot_price(ticker_symbol: str, date: datetime.date) -> float:
-    ticker = yf.Ticker(ticker_symbol)
-    hist = ticker.history(interval="1d", start=date, end=date + timedelta(days=1))
-    ret = hist["Close"].iloc[-1]
-    return ret
+def get_spot_price_batch_func(arguments_list: list[dict]) -> list:
+    # Same results as get_spot_price_func, but all calls of a step share one download
+    return get_spot_price_batch(arguments_list, format_spot_price)
 
 
 def run_react_agent():
@@ -71,12 +75,23 @@ def run_react_agent():
     Returns:
     None
     """
-    llm = OpenAILLM(
-        "meta-llama/llama-3.2-3b-instruct/fp-16", "https://api.inference.net/v1",
-        # "meta-llama/llama-3.3-70b-instruct/fp-16", "https://api.inference.net/v1"
+    # Serve with the small model and escalate to the large one only when the agent gets stuck
+    llm = CascadeLLM(
+        OpenAILLM(
+            "meta-llama/llama-3.2-3b-instruct/fp-16", "https://api.inference.net/v1"
+        ),
+        OpenAILLM(
+            "meta-llama/llama-3.3-70b-instruct/fp-16", "https://api.inference.net/v1"
+        ),
     )
     llm_tools = [
-        llm_tool(get_spot_price_func),
+        # Close prices of past dates never change, so repeated calls are served from the cache
+        # Calls for several tickers or dates in one step are served by a single download
+        llm_tool(
+            get_spot_price_func,
+            cache=TieredCache(max_entries=1024, ttl=3600),
+            batch_function=get_spot_price_batch_func,
+        ),
         llm_tool(calculate_price_growth_func),
     ]
     agent = ReactAgent(llm, llm_tools)
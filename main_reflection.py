@@ -1,5 +1,6 @@
 import logging
 
+from model.cascade_llm import CascadeLLM
 from model_openai.openai_llm import OpenAILLM
 from reflection.reflection_agent import ReflectionAgent
 
@@ -14,9 +15,14 @@ def run_reflection_agent():
     Returns:
     None
     """
-    llm = OpenAILLM(
-        "meta-llama/llama-3.2-3b-instruct/fp-16", "https://api.inference.net/v1"
-        # "meta-llama/llama-3.3-70b-instruct/fp-16", "https://api.inference.net/v1"
+    # Serve with the small model and escalate to the large one only when the critique is never satisfied
+    llm = CascadeLLM(
+        OpenAILLM(
+            "meta-llama/llama-3.2-3b-instruct/fp-16", "https://api.inference.net/v1"
+        ),
+        OpenAILLM(
+            "meta-llama/llama-3.3-70b-instruct/fp-16", "https://api.inference.net/v1"
+        ),
     )
     reflection_agent = ReflectionAgent(llm)
 
@@ -1,9 +1,9 @@
 import logging
 from datetime import datetime, timedelta
-import yfinance as yf
 import json
 from dateutil import parser
 
+from market_data.spot_prices import get_spot_price, get_spot_price_batch
 from model_openai.openai_llm import OpenAILLM
 from tool_use.llm_tool import convert_to_llm_tool as llm_tool
 from tool_use.tool_use_agent import (
@@ -42,11 +42,9 @@ def get_spot_price_func(ticker_symbol: str, date: str) -> float:
     return get_spot_price(ticker_symbol, date_converted)
 
 
-def get_spot_price(ticker_symbol: str, date: datetime.date) -> float:
-    ticker = yf.Ticker(ticker_symbol)
-    hist = ticker.history(interval="1d", start=date, end=date + timedelta(days=1))
-    ret = hist["Close"].iloc[-1]
-    return ret
+def get_spot_price_batch_func(arguments_list: list[dict]) -> list:
+    # Same results as get_spot_price_func, but all calls share one download
+    return get_spot_price_batch(arguments_list)
 
 
 def run_tool_agent():
@@ -65,7 +63,8 @@ def run_tool_agent():
     )
     llm_tools = [
         llm_tool(get_current_temperature_func),
-        llm_tool(get_spot_price_func),
+        # Calls for several tickers or dates are served by a single download
+        llm_tool(get_spot_price_func, batch_function=get_spot_price_batch_func),
     ]
     agent = ToolUseAgent(llm, llm_tools)
 
@@ -0,0 +1,169 @@
+import csv
+import os
+import threading
+from datetime import date, datetime
+from typing import Callable
+
+import numpy as np
+
+# Fetches daily closes for the tickers over an inclusive date range:
+# (tickers, start, end) -> {ticker: [(date, close), ...]}
+PriceFetcher = Callable[[list[str], date, date], dict[str, list[tuple[date, float]]]]
+
+
+def _day(value: date) -> int:
+    # Dates are stored as proleptic Gregorian ordinals, datetimes are truncated to their day
+    if isinstance(value, datetime):
+        value = value.date()
+    return value.toordinal()
+
+
+class PriceStore:
+    def __init__(self, path: str, fetch: PriceFetcher | None = None):
+        # One directory per ticker with sorted day ordinals, closes and the day ranges already fetched
+        self.path = path
+        self.fetch = fetch
+        os.makedirs(path, exist_ok=True)
+        # Memory-mapped arrays per ticker: (days, closes, ranges)
+        self._tickers: dict[str, tuple] = {}
+        self._lock = threading.Lock()
+        self.fetches = 0
+
+    def _ticker_path(self, ticker_symbol: str) -> str:
+        return os.path.join(self.path, ticker_symbol.upper())
+
+    def _load(self, ticker_symbol: str) -> tuple:
+        arrays = self._tickers.get(ticker_symbol)
+        if arrays is None:
+            ticker_path = self._ticker_path(ticker_symbol)
+            if os.path.exists(os.path.join(ticker_path, "ranges.npy")):
+                arrays = tuple(
+                    np.load(os.path.join(ticker_path, f"{name}.npy"), mmap_mode="r")
+                    for name in ("days", "closes", "ranges")
+                )
+            else:
+                arrays = (
+                    np.empty(0, dtype=np.int64),
+                    np.empty(0, dtype=np.float64),
+                    np.empty((0, 2), dtype=np.int64),
+                )
+            self._tickers[ticker_symbol] = arrays
+        return arrays
+
+    def _save(self, ticker_symbol: str, days, closes, ranges):
+        ticker_path = self._ticker_path(ticker_symbol)
+        os.makedirs(ticker_path, exist_ok=True)
+        for name, array in (("days", days), ("closes", closes), ("ranges", ranges)):
+            # Write aside and swap, so readers never map a partially written file
+            tmp_path = os.path.join(ticker_path, f"{name}.tmp.npy")
+            np.save(tmp_path, array)
+            os.replace(tmp_path, os.path.join(ticker_path, f"{name}.npy"))
+        self._tickers.pop(ticker_symbol, None)
+
+    def _is_covered(self, ranges, day: int) -> bool:
+        # Ranges are sorted and disjoint, so only the last one starting before the day can hold it
+        i = np.searchsorted(ranges[:, 0], day, side="right") - 1
+        return i >= 0 and day <= ranges[i, 1]
+
+    def _merge_ranges(self, ranges, start: int, end: int):
+        merged = []
+        for range_start, range_end in sorted([*ranges.tolist(), [start, end]]):
+            # Adjacent ranges are joined as well
+            if merged and range_start <= merged[-1][1] + 1:
+                merged[-1][1] = max(merged[-1][1], range_end)
+            else:
+                merged.append([range_start, range_end])
+        return np.array(merged, dtype=np.int64).reshape(-1, 2)
+
+    def add_prices(
+        self,
+        ticker_symbol: str,
+        prices: list[tuple[date, float]],
+        start: date,
+        end: date,
+    ):
+        # Store the closes and mark the whole range as known, days without a close are non-trading days
+        ticker_symbol = ticker_symbol.upper()
+        with self._lock:
+            days, closes, ranges = self._load(ticker_symbol)
+            new_days = np.array([_day(day) for day, _ in prices], dtype=np.int64)
+            new_closes = np.array([close for _, close in prices], dtype=np.float64)
+            # Fresh closes replace stored ones for the same day
+            keep = ~np.isin(days, new_days)
+            days = np.concatenate([days[keep], new_days])
+            closes = np.concatenate([closes[keep], new_closes])
+            order = np.argsort(days, kind="stable")
+            # Today's close is not final yet, so it stays fetchable
+            end_day = min(_day(end), date.today().toordinal() - 1)
+            if end_day >= _day(start):
+                ranges = self._merge_ranges(ranges, _day(start), end_day)
+            self._save(ticker_symbol, days[order], closes[order], ranges)
+
+    def load_csv(self, ticker_symbol: str, csv_path: str):
+        # Builds the store offline from daily bars with Date and Close columns, as exported by yfinance
+        prices = []
+        with open(csv_path, newline="") as f:
+            for row in csv.DictReader(f):
+                if row.get("Close"):
+                    prices.append(
+                        (date.fromisoformat(row["Date"][:10]), float(row["Close"]))
+                    )
+        if prices:
+            days = [day for day, _ in prices]
+            self.add_prices(ticker_symbol, prices, min(days), max(days))
+
+    def _missing_ranges(
+        self, requests: list[tuple[str, date]]
+    ) -> dict[str, tuple[date, date]]:
+        # One range per ticker spanning all of its requested days that were never fetched
+        missing = {}
+        with self._lock:
+            for ticker_symbol, day in requests:
+                ticker_symbol = ticker_symbol.upper()
+                if self._is_covered(self._load(ticker_symbol)[2], _day(day)):
+                    continue
+                day = day.date() if isinstance(day, datetime) else day
+                start, end = missing.get(ticker_symbol, (day, day))
+                missing[ticker_symbol] = (min(start, day), max(end, day))
+        return missing
+
+    def _fill(self, requests: list[tuple[str, date]]):
+        missing = self._missing_ranges(requests)
+        if not missing or self.fetch is None:
+            return
+        # Tickers missing the same range are fetched together
+        by_range: dict[tuple[date, date], list[str]] = {}
+        for ticker_symbol, day_range in missing.items():
+            by_range.setdefault(day_range, []).append(ticker_symbol)
+        for (start, end), tickers in by_range.items():
+            fetched = self.fetch(tickers, start, end)
+            self.fetches += 1
+            for ticker_symbol in tickers:
+                prices = fetched.get(ticker_symbol)
+                # Failed or rate-limited downloads come back empty instead of raising,
+                # so a range is only marked as known once it returned a close
+                if prices:
+                    self.add_prices(ticker_symbol, prices, start, end)
+
+    def _lookup(self, ticker_symbol: str, day: date) -> float:
+        with self._lock:
+            days, closes, _ = self._load(ticker_symbol.upper())
+        i = np.searchsorted(days, _day(day))
+        if i == len(days) or days[i] != _day(day):
+            raise ValueError(f"No close price for {ticker_symbol} on {day:%Y-%m-%d}.")
+        return float(closes[i])
+
+    def get_closes(self, requests: list[tuple[str, date]]) -> list:
+        # Results in request order, a missing price fails only its own request
+        self._fill(requests)
+        ret = []
+        for ticker_symbol, day in requests:
+            try:
+                ret.append(self._lookup(ticker_symbol, day))
+            except ValueError as e:
+                ret.append(e)
+        return ret
+
+    def get_close(self, ticker_symbol: str, day: date) -> float:
+        self._fill([(ticker_symbol, day)])
+        return self._lookup(ticker_symbol, day)
@@ -0,0 +1,52 @@
+from datetime import date, datetime
+from functools import lru_cache
+from typing import Callable
+
+from dateutil import parser
+
+from market_data.price_store import PriceStore
+from market_data.yfinance_source import fetch_yfinance_closes
+
+PRICE_STORE_PATH = ".price_store"
+
+
+@lru_cache(maxsize=None)
+def get_price_store() -> PriceStore:
+    # Created on first use, so importing the examples (also in spawned tool workers) writes nothing
+    return PriceStore(PRICE_STORE_PATH, fetch_yfinance_closes)
+
+
+def get_spot_price(ticker_symbol: str, day: date) -> float:
+    # Past closes never change, so they are served from the local store after the first download
+    return get_price_store().get_close(ticker_symbol, day)
+
+
+def get_spot_prices(requests: list[tuple[str, date]]) -> list:
+    # Missing ranges of all requested tickers are filled by one bulk download
+    return get_price_store().get_closes(requests)
+
+
+def get_spot_price_batch(
+    arguments_list: list[dict],
+    format_result: Callable[[str, datetime, float], object] | None = None,
+    store: PriceStore | None = None,
+) -> list:
+    # One result per spot price call, a malformed call or missing price fails only its own result
+    store = store or get_price_store()
+    results = [None] * len(arguments_list)
+    requests = []
+    for i, arguments in enumerate(arguments_list):
+        try:
+            requests.append(
+                (i, arguments["ticker_symbol"], parser.parse(arguments["date"]))
+            )
+        except Exception as e:
+            results[i] = e
+    # The calls that parsed share one bulk fetch
+    prices = store.get_closes([(ticker, day) for _, ticker, day in requests])
+    for (i, ticker_symbol, day), price in zip(requests, prices):
+        if isinstance(price, Exception) or format_result is None:
+            results[i] = price
+        else:
+            results[i] = format_result(ticker_symbol, day, price)
+    return results
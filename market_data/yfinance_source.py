@@ -0,0 +1,31 @@
+from datetime import date, timedelta
+
+import yfinance as yf
+
+
+def fetch_yfinance_closes(
+    tickers: list[str], start: date, end: date
+) -> dict[str, list[tuple[date, float]]]:
+    # One bulk download for every ticker, the end date is exclusive in yfinance
+    hist = yf.download(
+        tickers,
+        interval="1d",
+        start=start,
+        end=end + timedelta(days=1),
+        progress=False,
+        # Adjusted closes, like Ticker.history
+        auto_adjust=True,
+    )
+    closes = hist["Close"]
+    if closes.ndim == 1:
+        # Older yfinance versions drop the ticker level for a single ticker
+        closes = closes.to_frame(tickers[0])
+    ret = {}
+    for ticker_symbol in tickers:
+        if ticker_symbol not in closes:
+            continue
+        series = closes[ticker_symbol].dropna()
+        ret[ticker_symbol] = [
+            (timestamp.date(), float(close)) for timestamp, close in series.items()
+        ]
+    return ret
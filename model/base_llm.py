@@ -1,8 +1,38 @@
-import os
+import asyncio
+from typing import AsyncIterator, Iterator
+
 
 class BaseLLM:
     def __init__(self, model_name: str):
         self.model_name = model_name
+        # Extra parameters sent with every completion request (temperature, max_tokens, ...)
+        self.generation_params: dict = {}
 
     def generate(self, messages: list) -> str:
-        raise NotImplementedError("Subclasses should implement this method.")
\ No newline at end of file
+        raise NotImplementedError("Subclasses should implement this method.")
+
+    async def agenerate(self, messages: list) -> str:
+        # Fall back to the blocking implementation on a worker thread, so the event loop is never blocked
+        return await asyncio.to_thread(self.generate, messages)
+
+    def generate_stream(self, messages: list) -> Iterator[str]:
+        # Fall back to a single chunk holding the whole response
+        yield self.generate(messages)
+
+    async def agenerate_stream(self, messages: list) -> AsyncIterator[str]:
+        yield await self.agenerate(messages)
+
+    def generate_tool_calls(
+        self, messages: list, tools: list[dict], tool_choice: str = "auto"
+    ) -> tuple[str, list[dict]]:
+        # Returns the text content and the native tool calls as {"id", "name", "arguments"} dicts
+        raise NotImplementedError(
+            f"{type(self).__name__} does not support native tool calling."
+        )
+
+    async def agenerate_tool_calls(
+        self, messages: list, tools: list[dict], tool_choice: str = "auto"
+    ) -> tuple[str, list[dict]]:
+        return await asyncio.to_thread(
+            self.generate_tool_calls, messages, tools, tool_choice
+        )
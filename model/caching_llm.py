@@ -0,0 +1,95 @@
+import json
+from contextlib import aclosing, closing
+from typing import AsyncIterator, Iterator
+
+import xxhash
+
+from model.base_llm import BaseLLM
+from model.tiered_cache import TieredCache, MISSING
+
+
+class CachingLLM(BaseLLM):
+    def __init__(self, llm: BaseLLM, cache: TieredCache | None = None):
+        super().__init__(llm.model_name)
+        self.llm = llm
+        self.generation_params = llm.generation_params
+        self.cache = cache or TieredCache()
+
+    def _cache_key(self, messages: list, *extra) -> str:
+        # Stable serialization, so equal requests hash equally across processes
+        payload = json.dumps(
+            [self.model_name, messages, self.generation_params, *extra],
+            sort_keys=True,
+            separators=(",", ":"),
+            ensure_ascii=False,
+            default=str,
+        )
+        return xxhash.xxh3_128_hexdigest(payload.encode())
+
+    def generate(self, messages: list) -> str:
+        key = self._cache_key(messages)
+        response = self.cache.get(key)
+        if response is MISSING:
+            response = self.llm.generate(messages)
+            self.cache.set(key, response)
+        return response
+
+    async def agenerate(self, messages: list) -> str:
+        key = self._cache_key(messages)
+        response = self.cache.get(key)
+        if response is MISSING:
+            response = await self.llm.agenerate(messages)
+            self.cache.set(key, response)
+        return response
+
+    def generate_stream(self, messages: list) -> Iterator[str]:
+        key = self._cache_key(messages)
+        response = self.cache.get(key)
+        if response is not MISSING:
+            yield response
+            return
+        chunks = []
+        # Closing the inner stream when the caller stops early cancels the upstream request
+        with closing(self.llm.generate_stream(messages)) as stream:
+            for chunk in stream:
+                chunks.append(chunk)
+                yield chunk
+        # Only cache streams that were consumed to the end, never early-stopped ones
+        self.cache.set(key, "".join(chunks))
+
+    async def agenerate_stream(self, messages: list) -> AsyncIterator[str]:
+        key = self._cache_key(messages)
+        response = self.cache.get(key)
+        if response is not MISSING:
+            yield response
+            return
+        chunks = []
+        # Closing the inner stream when the caller stops early cancels the upstream request
+        async with aclosing(self.llm.agenerate_stream(messages)) as stream:
+            async for chunk in stream:
+                chunks.append(chunk)
+                yield chunk
+        # Only cache streams that were consumed to the end, never early-stopped ones
+        self.cache.set(key, "".join(chunks))
+
+    def generate_tool_calls(
+        self, messages: list, tools: list[dict], tool_choice: str = "auto"
+    ) -> tuple[str, list[dict]]:
+        key = self._cache_key(messages, tools, tool_choice)
+        response = self.cache.get(key)
+        if response is MISSING:
+            response = self.llm.generate_tool_calls(messages, tools, tool_choice)
+            self.cache.set(key, response)
+        content, tool_calls = response
+        return content, tool_calls
+
+    async def agenerate_tool_calls(
+        self, messages: list, tools: list[dict], tool_choice: str = "auto"
+    ) -> tuple[str, list[dict]]:
+        key = self._cache_key(messages, tools, tool_choice)
+        response = self.cache.get(key)
+        if response is MISSING:
+            response = await self.llm.agenerate_tool_calls(messages, tools, tool_choice)
+            self.cache.set(key, response)
+        content, tool_calls = response
+        return content, tool_calls
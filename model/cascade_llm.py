@@ -0,0 +1,53 @@
+import logging
+import threading
+from typing import AsyncIterator, Iterator
+
+from model.base_llm import BaseLLM
+
+
+class CascadeLLM(BaseLLM):
+    def __init__(self, small: BaseLLM, large: BaseLLM):
+        # Serves every request with the small model until an agent asks to escalate
+        super().__init__(small.model_name)
+        self.small = small
+        self.large = large
+        self.generation_params = small.generation_params
+        self.escalations = 0
+        self._lock = threading.Lock()
+
+    def generate(self, messages: list) -> str:
+        return self.small.generate(messages)
+
+    async def agenerate(self, messages: list) -> str:
+        return await self.small.agenerate(messages)
+
+    def generate_stream(self, messages: list) -> Iterator[str]:
+        return self.small.generate_stream(messages)
+
+    def agenerate_stream(self, messages: list) -> AsyncIterator[str]:
+        return self.small.agenerate_stream(messages)
+
+    def generate_tool_calls(
+        self, messages: list, tools: list[dict], tool_choice: str = "auto"
+    ) -> tuple[str, list[dict]]:
+        return self.small.generate_tool_calls(messages, tools, tool_choice)
+
+    async def agenerate_tool_calls(
+        self, messages: list, tools: list[dict], tool_choice: str = "auto"
+    ) -> tuple[str, list[dict]]:
+        return await self.small.agenerate_tool_calls(messages, tools, tool_choice)
+
+    def escalate(self, reason: str) -> BaseLLM:
+        with self._lock:
+            self.escalations += 1
+        logging.info(
+            f"Escalating from {self.small.model_name} to {self.large.model_name}: {reason}"
+        )
+        return self.large
+
+
+def escalate(llm: BaseLLM, reason: str) -> BaseLLM:
+    # Agents keep the returned LLM for the rest of their session, so escalation never leaks across sessions
+    if isinstance(llm, CascadeLLM):
+        return llm.escalate(reason)
+    return llm
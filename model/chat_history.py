@@ -0,0 +1,68 @@
+from collections import deque
+
+from model.tokens import count_message_tokens
+
+
+class ChatMessage:
+    __slots__ = ("message", "token_count")
+
+    def __init__(self, message: dict, token_count: int = 0):
+        # Keeps the OpenAI formatted message, so serializing the history never copies it
+        self.message = message
+        self.token_count = token_count
+
+    @property
+    def role(self) -> str:
+        return self.message["role"]
+
+    @property
+    def content(self) -> str:
+        return self.message["content"]
+
+
+class ChatHistory:
+    def __init__(
+        self,
+        static_head_num: int,
+        max_tail_num: int,
+        max_tail_tokens: int | None = None,
+        model_name: str = "",
+    ):
+        self.static_head_num = static_head_num
+        self.max_tail_num = max_tail_num
+        # Optional token budget for the tail, evicting the oldest messages once exceeded
+        self.max_tail_tokens = max_tail_tokens
+        self.model_name = model_name
+        # The head is pinned (system prompt, user query), the tail is a ring evicting its oldest message
+        self._head: list[ChatMessage] = []
+        self._tail: deque[ChatMessage] = deque(maxlen=max_tail_num)
+        self.tail_tokens = 0
+
+    def add(self, msg: dict):
+        if len(self._head) < self.static_head_num:
+            self._head.append(ChatMessage(msg))
+            return
+        if self.max_tail_tokens is None:
+            self._tail.append(ChatMessage(msg))
+            return
+        # Count each message once, eviction only subtracts the cached counts
+        record = ChatMessage(msg, count_message_tokens(msg, self.model_name))
+        if len(self._tail) == self.max_tail_num:
+            self.tail_tokens -= self._tail[0].token_count
+        self._tail.append(record)
+        self.tail_tokens += record.token_count
+        # Always keep the newest message, even if it exceeds the budget on its own
+        while self.tail_tokens > self.max_tail_tokens and len(self._tail) > 1:
+            self.tail_tokens -= self._tail.popleft().token_count
+
+    def __len__(self) -> int:
+        return len(self._head) + len(self._tail)
+
+    def __iter__(self):
+        for record in self._head:
+            yield record.message
+        for record in self._tail:
+            yield record.message
+
+    def to_messages(self) -> list[dict]:
+        return list(self)
@@ -0,0 +1,145 @@
+import asyncio
+import os
+import struct
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows
+    fcntl = None
+
+# Bucket state: requests level, tokens level, last refill timestamp
+_STATE_FORMAT = "ddd"
+_STATE_SIZE = struct.calcsize(_STATE_FORMAT)
+
+
+class RateLimiter:
+    def __init__(
+        self,
+        requests_per_minute: float | None = None,
+        tokens_per_minute: float | None = None,
+        state_path: str | None = None,
+        default_completion_tokens: int = 512,
+    ):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.default_completion_tokens = default_completion_tokens
+        self._lock = threading.Lock()
+        self._state = (
+            float(requests_per_minute or 0),
+            float(tokens_per_minute or 0),
+            time.time(),
+        )
+        # A state file lets every worker process on the host draw from the same buckets
+        self._fd = None
+        if state_path:
+            if fcntl is None:
+                raise NotImplementedError(
+                    "Sharing a rate limiter between processes requires fcntl file locks"
+                )
+            self._fd = os.open(state_path, os.O_RDWR | os.O_CREAT, 0o644)
+            with self._locked():
+                if len(os.pread(self._fd, _STATE_SIZE, 0)) < _STATE_SIZE:
+                    self._write_state(self._state)
+
+    @contextmanager
+    def _locked(self):
+        # The thread lock guards this process, the file lock guards the other processes
+        with self._lock:
+            if self._fd is None:
+                yield
+                return
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def _read_state(self) -> tuple:
+        if self._fd is None:
+            return self._state
+        return struct.unpack(_STATE_FORMAT, os.pread(self._fd, _STATE_SIZE, 0))
+
+    def _write_state(self, state: tuple):
+        if self._fd is None:
+            self._state = state
+        else:
+            os.pwrite(self._fd, struct.pack(_STATE_FORMAT, *state), 0)
+
+    def _refilled_state(self) -> tuple:
+        requests, tokens, updated_at = self._read_state()
+        now = time.time()
+        elapsed = max(0.0, now - updated_at)
+        if self.requests_per_minute:
+            requests = min(
+                self.requests_per_minute,
+                requests + elapsed * self.requests_per_minute / 60,
+            )
+        if self.tokens_per_minute:
+            tokens = min(
+                self.tokens_per_minute, tokens + elapsed * self.tokens_per_minute / 60
+            )
+        return requests, tokens, now
+
+    def _reservation_size(self, estimated_tokens: int) -> int:
+        # A request larger than the bucket can never fit, so it only reserves a full bucket
+        if self.tokens_per_minute:
+            return min(estimated_tokens, int(self.tokens_per_minute))
+        return estimated_tokens
+
+    def _try_reserve(self, tokens_needed: int) -> float:
+        # Returns 0 when the reservation was made, or the number of seconds to wait otherwise
+        with self._locked():
+            requests, tokens, now = self._refilled_state()
+            wait = 0.0
+            if self.requests_per_minute and requests < 1:
+                wait = max(wait, (1 - requests) * 60 / self.requests_per_minute)
+            if self.tokens_per_minute:
+                if tokens < tokens_needed:
+                    wait = max(
+                        wait, (tokens_needed - tokens) * 60 / self.tokens_per_minute
+                    )
+            if wait == 0.0:
+                if self.requests_per_minute:
+                    requests -= 1
+                if self.tokens_per_minute:
+                    tokens -= tokens_needed
+            self._write_state((requests, tokens, now))
+            return wait
+
+    def estimate_tokens(self, messages: list, max_tokens: int | None = None) -> int:
+        # Roughly 4 characters per token for the prompt, plus the expected completion size
+        prompt_chars = sum(
+            len(str(message.get("content") or "")) for message in messages
+        )
+        return prompt_chars // 4 + (max_tokens or self.default_completion_tokens)
+
+    def acquire(self, estimated_tokens: int) -> int:
+        # Returns the tokens actually reserved, which is what settle has to refund against
+        reserved = self._reservation_size(estimated_tokens)
+        while True:
+            wait = self._try_reserve(reserved)
+            if wait == 0.0:
+                return reserved
+            time.sleep(wait)
+
+    async def aacquire(self, estimated_tokens: int) -> int:
+        reserved = self._reservation_size(estimated_tokens)
+        while True:
+            wait = self._try_reserve(reserved)
+            if wait == 0.0:
+                return reserved
+            await asyncio.sleep(wait)
+
+    def settle(self, reserved_tokens: int, actual_tokens: int):
+        if not self.tokens_per_minute:
+            return
+        with self._locked():
+            requests, tokens, now = self._refilled_state()
+            # Refund over-estimates and charge under-estimates, which may leave the bucket in debt
+            tokens = min(
+                self.tokens_per_minute, tokens + reserved_tokens - actual_tokens
+            )
+            self._write_state((requests, tokens, now))
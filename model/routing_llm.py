@@ -0,0 +1,330 @@
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import aclosing, closing
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import AsyncIterator, Iterator
+
+from model.base_llm import BaseLLM
+
+
+class Endpoint:
+    def __init__(self, llm: BaseLLM, latency_window: int = 100):
+        self.llm = llm
+        self.ewma_latency: float | None = None
+        # Streams are timed to their first chunk, apart from the full latencies that set the hedging threshold
+        self.ewma_first_chunk: float | None = None
+        self.error_rate = 0.0
+        self.consecutive_errors = 0
+        self.ejected_until = 0.0
+        self.latencies = deque(maxlen=latency_window)
+
+    def p95_latency(self) -> float | None:
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+    def __repr__(self):
+        return f"Endpoint({self.llm.model_name}, ewma_latency={self.ewma_latency}, error_rate={self.error_rate:.2f})"
+
+
+class RoutingLLM(BaseLLM):
+    def __init__(
+        self,
+        llms: list[BaseLLM],
+        alpha: float = 0.2,
+        error_penalty: float = 4.0,
+        max_consecutive_errors: int = 3,
+        eject_seconds: float = 30.0,
+        hedge: bool = False,
+        hedge_min_samples: int = 20,
+    ):
+        super().__init__(llms[0].model_name)
+        self.endpoints = [Endpoint(llm) for llm in llms]
+        self.alpha = alpha
+        self.error_penalty = error_penalty
+        self.max_consecutive_errors = max_consecutive_errors
+        self.eject_seconds = eject_seconds
+        # Hedging sends a duplicate request to the next endpoint once the first one exceeds its p95 latency
+        self.hedge = hedge
+        self.hedge_min_samples = hedge_min_samples
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(thread_name_prefix="routing_llm")
+
+    def _score(self, endpoint: Endpoint, stream: bool = False) -> float:
+        latency = endpoint.ewma_first_chunk if stream else endpoint.ewma_latency
+        # Untried endpoints score best, so every endpoint gets explored, unless they only ever failed
+        if latency is None:
+            return float("inf") if endpoint.error_rate else 0.0
+        return latency * (1 + self.error_penalty * endpoint.error_rate)
+
+    def _ranked_endpoints(self, stream: bool = False) -> list[Endpoint]:
+        now = time.time()
+        with self._lock:
+            healthy = [e for e in self.endpoints if e.ejected_until <= now]
+            ejected = [e for e in self.endpoints if e.ejected_until > now]
+            healthy.sort(key=lambda e: self._score(e, stream))
+            # Ejected endpoints are only a last resort, soonest to recover first
+            ejected.sort(key=lambda e: e.ejected_until)
+            return healthy + ejected
+
+    def _ewma(self, average: float | None, latency: float) -> float:
+        if average is None:
+            return latency
+        return average + self.alpha * (latency - average)
+
+    def _record(
+        self, endpoint: Endpoint, latency: float, ok: bool, stream: bool = False
+    ):
+        with self._lock:
+            endpoint.error_rate += self.alpha * (
+                (0.0 if ok else 1.0) - endpoint.error_rate
+            )
+            if ok:
+                endpoint.consecutive_errors = 0
+                if stream:
+                    endpoint.ewma_first_chunk = self._ewma(
+                        endpoint.ewma_first_chunk, latency
+                    )
+                else:
+                    endpoint.latencies.append(latency)
+                    endpoint.ewma_latency = self._ewma(endpoint.ewma_latency, latency)
+                return
+            endpoint.consecutive_errors += 1
+            if endpoint.consecutive_errors >= self.max_consecutive_errors:
+                endpoint.ejected_until = time.time() + self.eject_seconds
+                # Let the endpoint prove itself again after the ejection period
+                endpoint.consecutive_errors = 0
+                logging.warning(f"Ejecting {endpoint} for {self.eject_seconds}s")
+
+    def _hedge_delay(self, endpoint: Endpoint) -> float | None:
+        if not self.hedge or len(endpoint.latencies) < self.hedge_min_samples:
+            return None
+        return endpoint.p95_latency()
+
+    def _timed_generate(self, endpoint: Endpoint, messages: list) -> str:
+        start = time.perf_counter()
+        try:
+            response = endpoint.llm.generate(messages)
+        except Exception:
+            self._record(endpoint, time.perf_counter() - start, False)
+            raise
+        self._record(endpoint, time.perf_counter() - start, True)
+        return response
+
+    async def _atimed_generate(self, endpoint: Endpoint, messages: list) -> str:
+        start = time.perf_counter()
+        try:
+            response = await endpoint.llm.agenerate(messages)
+        except asyncio.CancelledError:
+            # A cancelled hedge loser says nothing about the endpoint health
+            raise
+        except Exception:
+            self._record(endpoint, time.perf_counter() - start, False)
+            raise
+        self._record(endpoint, time.perf_counter() - start, True)
+        return response
+
+    def _hedged_generate(
+        self,
+        primary: Endpoint,
+        backup: Endpoint,
+        delay: float,
+        messages: list,
+        tried: set,
+    ) -> str:
+        futures = [self._executor.submit(self._timed_generate, primary, messages)]
+        done, _ = wait(futures, timeout=delay)
+        if not done:
+            logging.info(f"Hedging request to {backup} after {delay:.2f}s")
+            tried.add(backup)
+            futures.append(
+                self._executor.submit(self._timed_generate, backup, messages)
+            )
+        pending = set(futures)
+        last_error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    # The slower request keeps running in the background, only its result is ignored
+                    return future.result()
+                last_error = future.exception()
+        raise last_error
+
+    async def _ahedged_generate(
+        self,
+        primary: Endpoint,
+        backup: Endpoint,
+        delay: float,
+        messages: list,
+        tried: set,
+    ) -> str:
+        tasks = [asyncio.create_task(self._atimed_generate(primary, messages))]
+        done, _ = await asyncio.wait(tasks, timeout=delay)
+        if not done:
+            logging.info(f"Hedging request to {backup} after {delay:.2f}s")
+            tried.add(backup)
+            tasks.append(asyncio.create_task(self._atimed_generate(backup, messages)))
+        pending = set(tasks)
+        last_error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    last_error = task.exception()
+            raise last_error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def generate(self, messages: list) -> str:
+        endpoints = self._ranked_endpoints()
+        last_error = None
+        # Endpoints already called, also as the backup of a failed hedged request
+        tried = set()
+        for i, endpoint in enumerate(endpoints):
+            if endpoint in tried:
+                continue
+            tried.add(endpoint)
+            try:
+                delay = self._hedge_delay(endpoint)
+                if delay is not None and i + 1 < len(endpoints):
+                    return self._hedged_generate(
+                        endpoint, endpoints[i + 1], delay, messages, tried
+                    )
+                return self._timed_generate(endpoint, messages)
+            except Exception as e:
+                # Fail over to the next best endpoint
+                logging.warning(f"{endpoint} failed: {e}")
+                last_error = e
+        raise last_error
+
+    async def agenerate(self, messages: list) -> str:
+        endpoints = self._ranked_endpoints()
+        last_error = None
+        # Endpoints already called, also as the backup of a failed hedged request
+        tried = set()
+        for i, endpoint in enumerate(endpoints):
+            if endpoint in tried:
+                continue
+            tried.add(endpoint)
+            try:
+                delay = self._hedge_delay(endpoint)
+                if delay is not None and i + 1 < len(endpoints):
+                    return await self._ahedged_generate(
+                        endpoint, endpoints[i + 1], delay, messages, tried
+                    )
+                return await self._atimed_generate(endpoint, messages)
+            except Exception as e:
+                # Fail over to the next best endpoint
+                logging.warning(f"{endpoint} failed: {e}")
+                last_error = e
+        raise last_error
+
+    def generate_tool_calls(
+        self, messages: list, tools: list[dict], tool_choice: str = "auto"
+    ) -> tuple[str, list[dict]]:
+        last_error = None
+        for endpoint in self._ranked_endpoints():
+            start = time.perf_counter()
+            try:
+                response = endpoint.llm.generate_tool_calls(
+                    messages, tools, tool_choice
+                )
+            except Exception as e:
+                self._record(endpoint, time.perf_counter() - start, False)
+                # Fail over to the next best endpoint
+                logging.warning(f"{endpoint} failed: {e}")
+                last_error = e
+                continue
+            self._record(endpoint, time.perf_counter() - start, True)
+            return response
+        raise last_error
+
+    async def agenerate_tool_calls(
+        self, messages: list, tools: list[dict], tool_choice: str = "auto"
+    ) -> tuple[str, list[dict]]:
+        last_error = None
+        for endpoint in self._ranked_endpoints():
+            start = time.perf_counter()
+            try:
+                response = await endpoint.llm.agenerate_tool_calls(
+                    messages, tools, tool_choice
+                )
+            except Exception as e:
+                self._record(endpoint, time.perf_counter() - start, False)
+                # Fail over to the next best endpoint
+                logging.warning(f"{endpoint} failed: {e}")
+                last_error = e
+                continue
+            self._record(endpoint, time.perf_counter() - start, True)
+            return response
+        raise last_error
+
+    def generate_stream(self, messages: list) -> Iterator[str]:
+        last_error = None
+        for endpoint in self._ranked_endpoints(stream=True):
+            start = time.perf_counter()
+            first_chunk = None
+            try:
+                # Closing the inner stream as soon as the caller stops early cancels the upstream request
+                with closing(endpoint.llm.generate_stream(messages)) as chunks:
+                    for chunk in chunks:
+                        if first_chunk is None:
+                            first_chunk = time.perf_counter() - start
+                        yield chunk
+            except GeneratorExit:
+                if first_chunk is not None:
+                    self._record(endpoint, first_chunk, True, stream=True)
+                raise
+            except Exception as e:
+                self._record(endpoint, time.perf_counter() - start, False, stream=True)
+                # Failing over is only possible before anything was handed to the caller
+                if first_chunk is not None:
+                    raise
+                logging.warning(f"{endpoint} failed: {e}")
+                last_error = e
+                continue
+            if first_chunk is None:
+                first_chunk = time.perf_counter() - start
+            self._record(endpoint, first_chunk, True, stream=True)
+            return
+        raise last_error
+
+    async def agenerate_stream(self, messages: list) -> AsyncIterator[str]:
+        last_error = None
+        for endpoint in self._ranked_endpoints(stream=True):
+            start = time.perf_counter()
+            first_chunk = None
+            try:
+                # Closing the inner stream as soon as the caller stops early cancels the upstream request
+                async with aclosing(endpoint.llm.agenerate_stream(messages)) as chunks:
+                    async for chunk in chunks:
+                        if first_chunk is None:
+                            first_chunk = time.perf_counter() - start
+                        yield chunk
+            except (GeneratorExit, asyncio.CancelledError):
+                if first_chunk is not None:
+                    self._record(endpoint, first_chunk, True, stream=True)
+                raise
+            except Exception as e:
+                self._record(endpoint, time.perf_counter() - start, False, stream=True)
+                # Failing over is only possible before anything was handed to the caller
+                if first_chunk is not None:
+                    raise
+                logging.warning(f"{endpoint} failed: {e}")
+                last_error = e
+                continue
+            if first_chunk is None:
+                first_chunk = time.perf_counter() - start
+            self._record(endpoint, first_chunk, True, stream=True)
+            return
+        raise last_error
@@ -0,0 +1,54 @@
+import logging
+from functools import lru_cache
+
+import tiktoken
+
+# Tokens of conversation tail (observations, thoughts, critiques) kept in the prompt per model
+MODEL_HISTORY_TOKEN_BUDGETS = {
+    "meta-llama/llama-3.2-3b-instruct/fp-16": 8192,
+    "meta-llama/llama-3.3-70b-instruct/fp-16": 16384,
+}
+DEFAULT_HISTORY_TOKEN_BUDGET = 8192
+# Role and separator tokens the chat format adds around every message
+MESSAGE_TOKEN_OVERHEAD = 4
+# Characters per token of the estimate used when no tiktoken encoding can be loaded
+CHARS_PER_TOKEN = 4
+
+
+class CharEncoding:
+    # Splits text into fixed-size character chunks, so budgets and truncation keep working offline
+    def encode(self, text: str, disallowed_special=()) -> list[str]:
+        return [
+            text[i : i + CHARS_PER_TOKEN] for i in range(0, len(text), CHARS_PER_TOKEN)
+        ]
+
+    def decode(self, tokens: list[str]) -> str:
+        return "".join(tokens)
+
+
+@lru_cache(maxsize=None)
+def get_encoding(model_name: str) -> tiktoken.Encoding | CharEncoding:
+    # Non-OpenAI models have no tiktoken encoding, so approximate them with cl100k_base
+    try:
+        try:
+            return tiktoken.encoding_for_model(model_name)
+        except KeyError:
+            return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        # The BPE file is downloaded on first use, hosts without access fall back to the character estimate
+        logging.warning(
+            f"No tiktoken encoding for {model_name}, estimating tokens from characters: {e}"
+        )
+        return CharEncoding()
+
+
+def count_message_tokens(message: dict, model_name: str = "") -> int:
+    content = message.get("content") or ""
+    return (
+        len(get_encoding(model_name).encode(content, disallowed_special=()))
+        + MESSAGE_TOKEN_OVERHEAD
+    )
+
+
+def get_history_token_budget(model_name: str) -> int:
+    return MODEL_HISTORY_TOKEN_BUDGETS.get(model_name, DEFAULT_HISTORY_TOKEN_BUDGET)
@@ -1,24 +1,113 @@
-from datetime import datetime
-
-TYPE_DICTIONARY = {
-    "bool": bool,
-    "int": int,
-    "float": float,
-    "str": str,
-    "date": datetime.date,
+from datetime import date, datetime
+from typing import Callable
+
+from dateutil import parser
+
+
+def _coerce_bool(value) -> bool:
+    if isinstance(value, str):
+        # bool("false") would be True
+        return value.strip().lower() in ("true", "1", "yes", "y")
+    return bool(value)
+
+
+def _coerce_datetime(value) -> datetime:
+    if isinstance(value, datetime):
+        return value
+    if isinstance(value, date):
+        return datetime.combine(value, datetime.min.time())
+    try:
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        # Fall back to the lenient parser for formats like "May 7, 2025"
+        return parser.parse(str(value))
+
+
+def _coerce_date(value) -> date:
+    if isinstance(value, date) and not isinstance(value, datetime):
+        return value
+    return _coerce_datetime(value).date()
+
+
+def _with_type_check(typ: type, convert: Callable) -> Callable:
+    def coerce(value):
+        # Values of the right type are passed through untouched
+        if isinstance(value, typ):
+            return value
+        return convert(value)
+
+    return coerce
+
+
+# Converters from LLM provided argument values to the annotated parameter types
+TYPE_COERCERS: dict[str, Callable] = {
+    "bool": _with_type_check(bool, _coerce_bool),
+    "int": _with_type_check(int, int),
+    "float": _with_type_check(float, float),
+    "str": _with_type_check(str, str),
+    "date": _coerce_date,
+    "datetime": _coerce_datetime,
 }
 
 
+def get_type_coercer(type_name: str) -> Callable:
+    # Unknown types (lists, dicts, custom classes) are passed through as provided
+    return TYPE_COERCERS.get(type_name, lambda value: value)
+
+
 def create_message(message_text: str, role: str) -> dict:
     return {"role": role, "content": message_text}
 
 
-def add_message_to_history(
-    lst: list, msg: dict, static_head_num: int, max_tail_num: int
-):
-    lst.append(msg)
-    tail_len = len(lst) - static_head_num
-    if tail_len > max_tail_num:
-        # Number of items to remove from just after the static head
-        remove_count = tail_len - max_tail_num
-        del lst[static_head_num : static_head_num + remove_count]
+class TagStreamCollector:
+    def __init__(self, stop_tags: dict[str, tuple]):
+        # Maps each closing tag that may end the stream to the opening tags allowed to follow it
+        self.stop_tags = stop_tags
+        self.text = ""
+        self.done = False
+        self._scan_from = 0
+        self._stop_at = None
+        self._continue_tags = ()
+
+    def _find_stop_tag(self) -> tuple[int, str] | None:
+        found = None
+        for tag in self.stop_tags:
+            index = self.text.find(tag, self._scan_from)
+            if index != -1 and (found is None or index < found[0]):
+                found = (index, tag)
+        return found
+
+    def feed(self, chunk: str) -> bool:
+        self.text += chunk
+        while not self.done:
+            if self._stop_at is None:
+                found = self._find_stop_tag()
+                if found is None:
+                    # Keep the tail that may hold a partially received tag
+                    longest_tag = max(len(tag) for tag in self.stop_tags)
+                    self._scan_from = max(0, len(self.text) - longest_tag + 1)
+                    break
+                index, tag = found
+                self._stop_at = index + len(tag)
+                self._scan_from = self._stop_at
+                self._continue_tags = self.stop_tags[tag]
+            trailing = self.text[self._stop_at :].lstrip()
+            if not self._continue_tags:
+                self.done = True
+            elif not trailing or any(
+                tag.startswith(trailing) for tag in self._continue_tags
+            ):
+                # Wait for more text to decide whether another block follows
+                break
+            elif any(trailing.startswith(tag) for tag in self._continue_tags):
+                # Another block has started, so keep streaming until it closes
+                self._stop_at = None
+            else:
+                self.done = True
+        return self.done
+
+    def result(self) -> str:
+        # Drop anything generated after the last complete block once we stopped early
+        if self.done:
+            return self.text[: self._stop_at]
+        return self.text
@@ -0,0 +1,92 @@
+import asyncio
+import importlib.util
+import threading
+import weakref
+
+import dotenv
+from openai import OpenAI, AsyncOpenAI, DefaultHttpxClient, DefaultAsyncHttpxClient
+import httpx
+
+# Settings applied to every client created after configure_client_pool() is called
+POOL_CONFIG = {
+    "max_connections": 100,
+    "max_keepalive_connections": 20,
+    "keepalive_expiry": 30.0,
+    "http2": False,
+}
+
+_lock = threading.Lock()
+_env_loaded = False
+_clients: dict[tuple, OpenAI] = {}
+# Async connection pools are bound to the event loop that created them
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, dict]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def configure_client_pool(
+    max_connections: int | None = None,
+    max_keepalive_connections: int | None = None,
+    keepalive_expiry: float | None = None,
+    http2: bool | None = None,
+):
+    updates = {
+        "max_connections": max_connections,
+        "max_keepalive_connections": max_keepalive_connections,
+        "keepalive_expiry": keepalive_expiry,
+        "http2": http2,
+    }
+    # httpx only speaks HTTP/2 with the optional h2 package, fail here instead of at the first request
+    if http2 and importlib.util.find_spec("h2") is None:
+        raise ImportError(
+            "HTTP/2 needs the h2 package, install it with pip install 'httpx[http2]'"
+        )
+    with _lock:
+        POOL_CONFIG.update({k: v for k, v in updates.items() if v is not None})
+
+
+def load_env_once():
+    global _env_loaded
+    with _lock:
+        if not _env_loaded:
+            dotenv.load_dotenv()
+            _env_loaded = True
+
+
+def _limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=POOL_CONFIG["max_connections"],
+        max_keepalive_connections=POOL_CONFIG["max_keepalive_connections"],
+        keepalive_expiry=POOL_CONFIG["keepalive_expiry"],
+    )
+
+
+def get_openai_client(base_url: str, api_key: str | None) -> OpenAI:
+    key = (base_url, api_key)
+    with _lock:
+        client = _clients.get(key)
+        if client is None:
+            http_client = DefaultHttpxClient(
+                limits=_limits(), http2=POOL_CONFIG["http2"]
+            )
+            client = OpenAI(api_key=api_key, base_url=base_url, http_client=http_client)
+            _clients[key] = client
+        return client
+
+
+def get_async_openai_client(base_url: str, api_key: str | None) -> AsyncOpenAI:
+    # Must be called from a coroutine, so the client is shared within the running loop only
+    loop = asyncio.get_running_loop()
+    key = (base_url, api_key)
+    with _lock:
+        loop_clients = _async_clients.setdefault(loop, {})
+        client = loop_clients.get(key)
+        if client is None:
+            http_client = DefaultAsyncHttpxClient(
+                limits=_limits(), http2=POOL_CONFIG["http2"]
+            )
+            client = AsyncOpenAI(
+                api_key=api_key, base_url=base_url, http_client=http_client
+            )
+            loop_clients[key] = client
+        return client
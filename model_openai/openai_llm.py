@@ -1,22 +1,214 @@
 import logging
 import os
-import dotenv
-from openai import OpenAI
+from typing import AsyncIterator, Iterator
+from openai import AsyncOpenAI
 from model.base_llm import BaseLLM
+from model.rate_limiter import RateLimiter
+from model_openai.client_pool import (
+    load_env_once,
+    get_openai_client,
+    get_async_openai_client,
+)
 
 
 class OpenAILLM(BaseLLM):
-    def __init__(self, model_name: str, base_url: str):
+    def __init__(
+        self,
+        model_name: str,
+        base_url: str,
+        rate_limiter: RateLimiter | None = None,
+        **generation_params,
+    ):
         # self.model_name = model_name
         super().__init__(model_name)
-        dotenv.load_dotenv()
-        self.client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"), base_url=base_url)
+        self.generation_params = generation_params
+        self.rate_limiter = rate_limiter
+        load_env_once()
+        self.base_url = base_url
+        self.api_key = os.getenv("OPENAI_API_KEY")
+        # Clients come from a process-wide registry, so instances with the same endpoint share warm connections
+        self.client = get_openai_client(self.base_url, self.api_key)
 
-    def generate(self, messages: list) -> str:
-        response = self.client.chat.completions.create(
-            model=self.model_name,
-            messages=messages,
+    @property
+    def async_client(self) -> AsyncOpenAI:
+        return get_async_openai_client(self.base_url, self.api_key)
+
+    def _estimate_tokens(self, messages: list) -> int:
+        return self.rate_limiter.estimate_tokens(
+            messages, self.generation_params.get("max_tokens")
+        )
+
+    def _estimate_used_tokens(self, reserved_tokens: int, response_content: str) -> int:
+        # Charge the prompt estimate plus the received text
+        return (
+            reserved_tokens
+            - (
+                self.generation_params.get("max_tokens")
+                or self.rate_limiter.default_completion_tokens
+            )
+            + len(response_content) // 4
+        )
+
+    def _response_text(self, response) -> str:
+        message = response.choices[-1].message
+        return (message.content or "") + "".join(
+            tool_call.function.arguments or "" for tool_call in message.tool_calls or []
         )
+
+    def _settle(
+        self, reserved_tokens: int, response=None, response_content: str | None = None
+    ):
+        if self.rate_limiter is None:
+            return
+        if response is not None and getattr(response, "usage", None):
+            actual_tokens = response.usage.total_tokens
+        elif response is not None:
+            # Many OpenAI-compatible backends leave out usage
+            actual_tokens = self._estimate_used_tokens(
+                reserved_tokens, self._response_text(response)
+            )
+        elif response_content is not None:
+            # Streams carry no usage
+            actual_tokens = self._estimate_used_tokens(
+                reserved_tokens, response_content
+            )
+        else:
+            # Failed requests are refunded
+            actual_tokens = 0
+        self.rate_limiter.settle(reserved_tokens, actual_tokens)
+
+    def _reserve(self, messages: list) -> int:
+        if self.rate_limiter is None:
+            return 0
+        return self.rate_limiter.acquire(self._estimate_tokens(messages))
+
+    async def _areserve(self, messages: list) -> int:
+        if self.rate_limiter is None:
+            return 0
+        return await self.rate_limiter.aacquire(self._estimate_tokens(messages))
+
+    def generate(self, messages: list) -> str:
+        reserved_tokens = self._reserve(messages)
+        response = None
+        try:
+            response = self.client.chat.completions.create(
+                model=self.model_name,
+                messages=messages,
+                **self.generation_params,
+            )
+        finally:
+            self._settle(reserved_tokens, response)
+        response_content = response.choices[-1].message.content
+        logging.info(f"{response_content}")
+        return response_content
+
+    async def agenerate(self, messages: list) -> str:
+        reserved_tokens = await self._areserve(messages)
+        response = None
+        try:
+            response = await self.async_client.chat.completions.create(
+                model=self.model_name,
+                messages=messages,
+                **self.generation_params,
+            )
+        finally:
+            self._settle(reserved_tokens, response)
         response_content = response.choices[-1].message.content
         logging.info(f"{response_content}")
         return response_content
+
+    def _tool_call_response(self, response) -> tuple[str, list[dict]]:
+        message = response.choices[-1].message
+        # Arguments stay the raw JSON string, so the agent decides how to handle malformed ones
+        tool_calls = [
+            {
+                "id": tool_call.id,
+                "name": tool_call.function.name,
+                "arguments": tool_call.function.arguments,
+            }
+            for tool_call in message.tool_calls or []
+        ]
+        logging.info(f"{message.content} {tool_calls}")
+        return message.content or "", tool_calls
+
+    def generate_tool_calls(
+        self, messages: list, tools: list[dict], tool_choice: str = "auto"
+    ) -> tuple[str, list[dict]]:
+        reserved_tokens = self._reserve(messages)
+        response = None
+        try:
+            response = self.client.chat.completions.create(
+                model=self.model_name,
+                messages=messages,
+                tools=tools,
+                tool_choice=tool_choice,
+                **self.generation_params,
+            )
+        finally:
+            self._settle(reserved_tokens, response)
+        return self._tool_call_response(response)
+
+    async def agenerate_tool_calls(
+        self, messages: list, tools: list[dict], tool_choice: str = "auto"
+    ) -> tuple[str, list[dict]]:
+        reserved_tokens = await self._areserve(messages)
+        response = None
+        try:
+            response = await self.async_client.chat.completions.create(
+                model=self.model_name,
+                messages=messages,
+                tools=tools,
+                tool_choice=tool_choice,
+                **self.generation_params,
+            )
+        finally:
+            self._settle(reserved_tokens, response)
+        return self._tool_call_response(response)
+
+    def generate_stream(self, messages: list) -> Iterator[str]:
+        reserved_tokens = self._reserve(messages)
+        try:
+            stream = self.client.chat.completions.create(
+                model=self.model_name,
+                messages=messages,
+                **self.generation_params,
+                stream=True,
+            )
+        except Exception:
+            self._settle(reserved_tokens)
+            raise
+        response_content = ""
+        try:
+            for chunk in stream:
+                if chunk.choices and chunk.choices[-1].delta.content:
+                    response_content += chunk.choices[-1].delta.content
+                    yield chunk.choices[-1].delta.content
+        finally:
+            # Closing the stream drops the connection, which cancels the upstream generation
+            stream.close()
+            self._settle(reserved_tokens, response_content=response_content)
+            logging.info(f"{response_content}")
+
+    async def agenerate_stream(self, messages: list) -> AsyncIterator[str]:
+        reserved_tokens = await self._areserve(messages)
+        try:
+            stream = await self.async_client.chat.completions.create(
+                model=self.model_name,
+                messages=messages,
+                **self.generation_params,
+                stream=True,
+            )
+        except Exception:
+            self._settle(reserved_tokens)
+            raise
+        response_content = ""
+        try:
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[-1].delta.content:
+                    response_content += chunk.choices[-1].delta.content
+                    yield chunk.choices[-1].delta.content
+        finally:
+            # Closing the stream drops the connection, which cancels the upstream generation
+            await stream.close()
+            self._settle(reserved_tokens, response_content=response_content)
+            logging.info(f"{response_content}")
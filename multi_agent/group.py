@@ -63,3 +63,25 @@ class Group:
         # invoke the first member recursively and return the response
         ret = member_generate(self.members[0])
         return ret
+
+    async def agenerate(self, max_steps: int = 10):
+        ret = ""
+        counter = 0
+
+        # define a recursive coroutine to generate and call dependents
+        async def member_generate(current_member: MemberAgent):
+            nonlocal counter
+            if counter > max_steps:
+                return None
+            counter += 1
+            # generate response and add context to dependents
+            latest_ret = await current_member.agenerate()
+            # recursively call member dependents
+            for dependent in current_member.dependents:
+                if dependent in self.members and counter <= max_steps:
+                    latest_ret = await member_generate(dependent) or latest_ret
+            return latest_ret
+
+        # invoke the first member recursively and return the response
+        ret = await member_generate(self.members[0])
+        return ret
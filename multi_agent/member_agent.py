@@ -70,3 +70,13 @@ Process the following context:
         for d in self.dependents:
             d.add_context(result)
         return result
+
+    async def agenerate(self):
+        # Generate the result without blocking the event loop
+        result = await self.react_agent.agenerate(
+            self.member_agent_prompt % (self.dependencies_context)
+        )
+        # Add the result to the context of agents depending on this agent
+        for d in self.dependents:
+            d.add_context(result)
+        return result
@@ -0,0 +1,218 @@
+import json
+import logging
+
+from model.base_llm import BaseLLM
+from model.utils import create_message
+from plan_and_execute.utils import (
+    PLAN_TAG,
+    PLAN_TAG_END,
+    RESULTS_TAG,
+    RESULTS_TAG_END,
+    find_placeholders,
+    resolve_placeholders,
+)
+from reason_and_act.json_repair import parse_json
+from reason_and_act.react_agent import ReactAgent
+from reason_and_act.step_parser import STEP_ANSWER, parse_steps, step_contents
+from reason_and_act.utils import (
+    QUERY_TAG,
+    QUERY_TAG_END,
+    RESPONSE_TAG,
+    RESPONSE_TAG_END,
+)
+from tool_use.llm_tool import LLMTool
+from tool_use.tool_executor import invoke_tools, ainvoke_tools
+from tool_use.utils import (
+    TOOLS_DEFINITIONS_TAG,
+    TOOLS_DEFINITIONS_TAG_END,
+    compile_tool_definitions,
+)
+
+# Step kind -> tags of a planner response
+PLAN_STEP_TAGS = {"plan": (PLAN_TAG, PLAN_TAG_END)}
+
+
+class PlanStep:
+    __slots__ = ("step_id", "tool", "arguments", "depends_on")
+
+    def __init__(self, step_id: int, tool: LLMTool, arguments: dict, depends_on: set):
+        self.step_id = step_id
+        self.tool = tool
+        self.arguments = arguments
+        self.depends_on = depends_on
+
+
+class PlanAndExecuteAgent:
+    def __init__(
+        self,
+        llm: BaseLLM,
+        tools: list[LLMTool],
+        backstory_prompt: str = "",
+        max_plan_steps: int = 20,
+    ):
+        self.llm = llm
+        self.tools = tuple(tools)
+        self.tools_dict = {tool.name: tool for tool in self.tools}
+        self.max_plan_steps = max_plan_steps
+        # The ReAct loop takes over whenever a plan cannot be parsed or executed
+        self.react_agent = ReactAgent(llm, tools, backstory_prompt)
+        self.planner_prompt = f"""{backstory_prompt}
+You are a planning AI model. Plan all function calls needed to answer the user query in one go, they are executed for you afterwards.
+Function signatures are provided within {TOOLS_DEFINITIONS_TAG}{TOOLS_DEFINITIONS_TAG_END} XML tags.
+Return the plan as a JSON list of steps within {PLAN_TAG}{PLAN_TAG_END} XML tags. Each step has a unique integer "id", the function "name" and its "arguments".
+An argument can use the result of an earlier step by writing "$" followed by that step's id, for example "$1". Steps that do not depend on each other run at the same time.
+Do not make assumptions about argument values. If the query needs no functions, return an empty list.
+
+Here are the available functions:
+{compile_tool_definitions(self.tools)}
+
+Example user query:
+{QUERY_TAG}What was the growth rate of the NVDA close price between 2025-05-07 and 2025-05-14?{QUERY_TAG_END}
+
+Example plan:
+{PLAN_TAG}
+[{{"id": 1, "name": "get_spot_price_func", "arguments": {{"ticker_symbol": "NVDA", "date": "2025-05-07"}}}},
+{{"id": 2, "name": "get_spot_price_func", "arguments": {{"ticker_symbol": "NVDA", "date": "2025-05-14"}}}},
+{{"id": 3, "name": "calculate_price_growth_func", "arguments": {{"start_price": "$1", "end_price": "$2"}}}}]
+{PLAN_TAG_END}
+"""
+        self.answer_prompt = f"""{backstory_prompt}
+You are an AI model answering the user query. The results of the function calls made for it are provided within {RESULTS_TAG}{RESULTS_TAG_END} XML tags.
+Answer the user query fully within {RESPONSE_TAG}{RESPONSE_TAG_END} XML tags, without referring to any functions!
+"""
+        # Compiled once, identical for every session
+        self.planner_message = create_message(self.planner_prompt, "system")
+        self.answer_message = create_message(self.answer_prompt, "system")
+
+    def _planner_messages(self, user_msg: str) -> list[dict]:
+        return [
+            self.planner_message,
+            create_message(f"{QUERY_TAG}{user_msg}{QUERY_TAG_END}", "user"),
+        ]
+
+    def _parse_plan(self, response: str) -> list[PlanStep]:
+        plan_content = step_contents(parse_steps(response, PLAN_STEP_TAGS), "plan")
+        if not plan_content:
+            raise Exception("The response does not contain a plan.")
+        raw_steps = parse_json(plan_content[-1])
+        if not isinstance(raw_steps, list):
+            raise Exception("The plan is not a list of steps.")
+        if len(raw_steps) > self.max_plan_steps:
+            raise Exception(f"The plan has more than {self.max_plan_steps} steps.")
+        steps = {}
+        for raw_step in raw_steps:
+            if not isinstance(raw_step, dict) or not isinstance(
+                raw_step.get("id"), int
+            ):
+                raise Exception(f"Plan step {raw_step} has no integer id.")
+            if raw_step["id"] in steps:
+                raise Exception(f"Plan step id {raw_step['id']} is not unique.")
+            if raw_step.get("name") not in self.tools_dict:
+                raise Exception(f"Function {raw_step.get('name')} does not exist.")
+            arguments = raw_step.get("arguments") or {}
+            if not isinstance(arguments, dict):
+                raise Exception(f"Plan step {raw_step['id']} has no arguments object.")
+            steps[raw_step["id"]] = PlanStep(
+                raw_step["id"],
+                self.tools_dict[raw_step["name"]],
+                arguments,
+                find_placeholders(arguments),
+            )
+        for step in steps.values():
+            # Placeholders of unknown ids are plain text
+            step.depends_on &= steps.keys()
+        return list(steps.values())
+
+    def _plan_waves(self, steps: list[PlanStep]) -> list[list[PlanStep]]:
+        # Every wave holds the steps whose dependencies finished in earlier waves
+        waves = []
+        done = set()
+        remaining = steps
+        while remaining:
+            wave = [step for step in remaining if step.depends_on <= done]
+            if not wave:
+                raise Exception("The plan has circular dependencies.")
+            waves.append(wave)
+            done.update(step.step_id for step in wave)
+            remaining = [step for step in remaining if step.step_id not in done]
+        return waves
+
+    def _prepare_wave(
+        self, wave: list[PlanStep], results: dict
+    ) -> list[tuple[LLMTool, dict]]:
+        # Fill in the results of earlier steps and convert the arguments to the correct type
+        return [
+            (
+                step.tool,
+                step.tool.coerce_arguments(
+                    resolve_placeholders(step.arguments, results)
+                ),
+            )
+            for step in wave
+        ]
+
+    def _collect_wave(self, wave: list[PlanStep], wave_results: list, results: dict):
+        for step, result in zip(wave, wave_results):
+            if isinstance(result, Exception):
+                raise Exception(f"Plan step {step.step_id} failed: {result}")
+            results[step.step_id] = result
+
+    def _execute_plan(self, steps: list[PlanStep]) -> dict:
+        results = {}
+        for wave in self._plan_waves(steps):
+            # Independent steps of a wave run concurrently
+            wave_results = invoke_tools(self._prepare_wave(wave, results))
+            self._collect_wave(wave, wave_results, results)
+        return results
+
+    async def _aexecute_plan(self, steps: list[PlanStep]) -> dict:
+        results = {}
+        for wave in self._plan_waves(steps):
+            # Independent steps of a wave run concurrently
+            wave_results = await ainvoke_tools(self._prepare_wave(wave, results))
+            self._collect_wave(wave, wave_results, results)
+        return results
+
+    def _answer_messages(
+        self, user_msg: str, steps: list[PlanStep], results: dict
+    ) -> list[dict]:
+        results_text = "\n".join(
+            f"{step.step_id}. {step.tool.name}({json.dumps(resolve_placeholders(step.arguments, results), default=str)}): {results[step.step_id]}"
+            for step in steps
+        )
+        return [
+            self.answer_message,
+            create_message(f"{QUERY_TAG}{user_msg}{QUERY_TAG_END}", "user"),
+            create_message(f"{RESULTS_TAG}\n{results_text}\n{RESULTS_TAG_END}", "user"),
+        ]
+
+    def _extract_answer(self, response: str) -> str:
+        answer_content = step_contents(parse_steps(response), STEP_ANSWER)
+        # Without answer tags the whole response is the answer
+        return answer_content[-1] if answer_content else response
+
+    def generate(self, user_msg: str) -> str:
+        # One planning call, all tools, then one answering call
+        response = self.llm.generate(self._planner_messages(user_msg))
+        try:
+            steps = self._parse_plan(response)
+            results = self._execute_plan(steps)
+        except Exception as e:
+            logging.warning(f"Plan failed, falling back to ReAct: {e}")
+            return self.react_agent.generate(user_msg)
+        return self._extract_answer(
+            self.llm.generate(self._answer_messages(user_msg, steps, results))
+        )
+
+    async def agenerate(self, user_msg: str) -> str:
+        # One planning call, all tools, then one answering call, without blocking the event loop
+        response = await self.llm.agenerate(self._planner_messages(user_msg))
+        try:
+            steps = self._parse_plan(response)
+            results = await self._aexecute_plan(steps)
+        except Exception as e:
+            logging.warning(f"Plan failed, falling back to ReAct: {e}")
+            return await self.react_agent.agenerate(user_msg)
+        return self._extract_answer(
+            await self.llm.agenerate(self._answer_messages(user_msg, steps, results))
+        )
@@ -0,0 +1,36 @@
+import re
+
+PLAN_TAG = "<plan>"
+PLAN_TAG_END = "</plan>"
+RESULTS_TAG = "<results>"
+RESULTS_TAG_END = "</results>"
+# "$3" in a plan argument stands for the result of the plan step with id 3
+PLACEHOLDER_PATTERN = re.compile(r"\$(\d+)")
+
+
+def find_placeholders(value) -> set[int]:
+    # Step ids referenced anywhere in an argument value
+    if isinstance(value, str):
+        return {int(step_id) for step_id in PLACEHOLDER_PATTERN.findall(value)}
+    if isinstance(value, dict):
+        value = list(value.values())
+    if isinstance(value, list):
+        return set().union(*[find_placeholders(item) for item in value])
+    return set()
+
+
+def resolve_placeholders(value, results: dict):
+    # Ids that are not plan steps, like an amount of "$5", stay as they are
+    if isinstance(value, str):
+        match = PLACEHOLDER_PATTERN.fullmatch(value.strip())
+        if match is not None and int(match.group(1)) in results:
+            # A bare placeholder takes the result as it is, so numbers stay numbers
+            return results[int(match.group(1))]
+        return PLACEHOLDER_PATTERN.sub(
+            lambda m: str(results.get(int(m.group(1)), m.group(0))), value
+        )
+    if isinstance(value, dict):
+        return {key: resolve_placeholders(item, results) for key, item in value.items()}
+    if isinstance(value, list):
+        return [resolve_placeholders(item, results) for item in value]
+    return value
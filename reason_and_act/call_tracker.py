@@ -0,0 +1,65 @@
+import json
+
+from tool_use.llm_tool import LLMTool
+
+
+class CallTracker:
+    def __init__(self, max_repeated_steps: int = 2):
+        # Session-local record of function calls, keyed by name and coerced arguments
+        self.max_repeated_steps = max_repeated_steps
+        self.results: dict[tuple, object] = {}
+        self.steps: list[frozenset] = []
+        # Consecutive steps that only repeated calls answered before
+        self.repeated_steps = 0
+        self.served = 0
+
+    def fingerprint(self, tool: LLMTool, arguments: dict) -> tuple:
+        return (
+            tool.name,
+            json.dumps(arguments, sort_keys=True, separators=(",", ":"), default=str),
+        )
+
+    def known(self, tool: LLMTool, arguments: dict) -> bool:
+        return self.fingerprint(tool, arguments) in self.results
+
+    def serve(self, invocations: list) -> tuple[dict, list]:
+        # Results of calls answered earlier in the session, and the calls still to invoke
+        served = {}
+        to_invoke = []
+        for invocation in invocations:
+            counter, tool, arguments = invocation
+            if self.known(tool, arguments):
+                served[counter] = self.results[self.fingerprint(tool, arguments)]
+            else:
+                to_invoke.append(invocation)
+        self.served += len(served)
+        return served, to_invoke
+
+    def record(self, invocations: list, results: dict):
+        step = frozenset(
+            self.fingerprint(tool, arguments) for _, tool, arguments in invocations
+        )
+        if step and step <= self.results.keys():
+            self.repeated_steps += 1
+        else:
+            self.repeated_steps = 0
+        self.steps.append(step)
+        for counter, tool, arguments in invocations:
+            # Failed calls may succeed when retried, so only results are served again
+            if not isinstance(results[counter], Exception):
+                self.results[self.fingerprint(tool, arguments)] = results[counter]
+
+    @property
+    def repeated(self) -> bool:
+        # The last step only asked for results the model already had
+        return self.repeated_steps > 0
+
+    @property
+    def oscillating(self) -> bool:
+        # The last step went back to calls of an earlier, not directly preceding step (A, B, A)
+        return bool(self.steps) and self.steps[-1] in self.steps[:-2]
+
+    @property
+    def stuck(self) -> bool:
+        # Repeats right after a nudge mean more steps will not bring new information
+        return self.repeated_steps >= self.max_repeated_steps
@@ -0,0 +1,259 @@
+import json
+import re
+from json.decoder import scanstring
+
+# Function name of the fallback call returned when a tool call cannot be parsed
+SANITIZE_ERROR_NAME = "error"
+
+_WHITESPACE = " \t\r\n"
+_ESCAPES = {
+    '"': '"',
+    "'": "'",
+    "\\": "\\",
+    "/": "/",
+    "b": "\b",
+    "f": "\f",
+    "n": "\n",
+    "r": "\r",
+    "t": "\t",
+}
+# JSON and Python spellings of the literals
+_LITERALS = {
+    "true": True,
+    "false": False,
+    "null": None,
+    "True": True,
+    "False": False,
+    "None": None,
+}
+# Runs of string characters and valid JSON escapes up to the next quote or other backslash,
+# decoded at C speed by the json module
+_JSON_ESCAPE = r'\\(?:["\\/bfnrt]|u[0-9a-fA-F]{4})'
+_STRING_RUNS = {
+    '"': re.compile(rf'[^"\\]*(?:{_JSON_ESCAPE}[^"\\]*)*'),
+    "'": re.compile(rf"""[^'"\\]*(?:{_JSON_ESCAPE}[^'"\\]*)*"""),
+}
+_HEX4 = re.compile(r"[0-9a-fA-F]{4}")
+_NUMBER = re.compile(r"-?\d+(\.\d+)?([eE][+-]?\d+)?")
+_BARE_KEY = re.compile(r"[^:{}\[\],\"'\s][^:{}\[\],\"']*")
+_BARE_KEY_START = re.compile(r"[A-Za-z_$][\w$-]*\s*:")
+_BARE_VALUE = re.compile(r"[^,}\]\n]+")
+
+# Where a string ends: a key before its colon, a value before the next member or the end of its container
+_KEY = "key"
+_OBJECT_VALUE = "object"
+_ARRAY_VALUE = "array"
+_TOP_LEVEL = "top"
+
+
+class _Parser:
+    def __init__(self, text: str):
+        self.text = text
+        self.length = len(text)
+        self.pos = 0
+
+    def _skip_whitespace(self, pos: int) -> int:
+        text = self.text
+        while pos < self.length and text[pos] in _WHITESPACE:
+            pos += 1
+        return pos
+
+    def _closes_string(self, pos: int, context: str) -> bool:
+        # A quote only ends the string when the structure continues after it, otherwise it is content
+        pos = self._skip_whitespace(pos)
+        if pos >= self.length or context == _TOP_LEVEL:
+            return True
+        char = self.text[pos]
+        if context == _KEY:
+            return char == ":"
+        if context == _ARRAY_VALUE:
+            return char in ",]"
+        if char == "}":
+            return True
+        if char != ",":
+            return False
+        # After a comma another key or the end of the object must follow
+        pos = self._skip_whitespace(pos + 1)
+        return (
+            pos >= self.length
+            or self.text[pos] in "\"'}"
+            or _BARE_KEY_START.match(self.text, pos) is not None
+        )
+
+    def _string(self, context: str) -> str:
+        text = self.text
+        quote = text[self.pos]
+        runs = _STRING_RUNS[quote]
+        parts = []
+        pos = self.pos + 1
+        while pos < self.length:
+            run = runs.match(text, pos)
+            if run.end() > pos:
+                run_text = run.group()
+                parts.append(
+                    scanstring(run_text + '"', 0, False)[0]
+                    if "\\" in run_text
+                    else run_text
+                )
+                pos = run.end()
+                if pos >= self.length:
+                    break
+            if text[pos] == '"' and quote == "'":
+                parts.append('"')
+                pos += 1
+            elif text[pos] == "\\":
+                escaped = text[pos + 1 : pos + 2]
+                if escaped == "u" and _HEX4.match(text, pos + 2):
+                    parts.append(chr(int(text[pos + 2 : pos + 6], 16)))
+                    pos += 6
+                elif escaped in _ESCAPES and escaped:
+                    parts.append(_ESCAPES[escaped])
+                    pos += 2
+                else:
+                    # Invalid escapes keep their backslash
+                    parts.append("\\")
+                    pos += 1
+            elif self._closes_string(pos + 1, context):
+                pos += 1
+                break
+            else:
+                # Unescaped inner quote
+                parts.append(quote)
+                pos += 1
+        self.pos = pos
+        return "".join(parts)
+
+    def _bare_value(self):
+        match = _NUMBER.match(self.text, self.pos)
+        if match is not None:
+            end = self._skip_whitespace(match.end())
+            if end >= self.length or self.text[end] in ",}]\n":
+                self.pos = match.end()
+                number = match.group()
+                return (
+                    float(number) if match.group(1) or match.group(2) else int(number)
+                )
+        match = _BARE_VALUE.match(self.text, self.pos)
+        if match is None:
+            # Stray structural character, skip it so parsing always advances
+            self.pos += 1
+            return None
+        self.pos = match.end()
+        word = match.group().strip()
+        return _LITERALS.get(word, word)
+
+    def value(self, context: str = _TOP_LEVEL):
+        self.pos = self._skip_whitespace(self.pos)
+        if self.pos >= self.length:
+            return None
+        char = self.text[self.pos]
+        if char == "{":
+            return self._object()
+        if char == "[":
+            return self._array()
+        if char in "\"'":
+            return self._string(context)
+        return self._bare_value()
+
+    def _key(self) -> str:
+        if self.text[self.pos] in "\"'":
+            return self._string(_KEY)
+        match = _BARE_KEY.match(self.text, self.pos)
+        if match is None:
+            self.pos += 1
+            return ""
+        self.pos = match.end()
+        return match.group().strip()
+
+    def _object(self) -> dict:
+        result = {}
+        self.pos += 1
+        while True:
+            self.pos = self._skip_whitespace(self.pos)
+            if self.pos >= self.length:
+                # Missing closing braces are implied
+                return result
+            char = self.text[self.pos]
+            if char == "}":
+                self.pos += 1
+                return result
+            if char in ",]":
+                # Trailing, doubled or stray separators
+                self.pos += 1
+                continue
+            key = self._key()
+            self.pos = self._skip_whitespace(self.pos)
+            if self.pos < self.length and self.text[self.pos] == ":":
+                self.pos += 1
+                result[key] = self.value(_OBJECT_VALUE)
+            elif key:
+                result[key] = None
+
+    def _array(self) -> list:
+        result = []
+        self.pos += 1
+        while True:
+            self.pos = self._skip_whitespace(self.pos)
+            if self.pos >= self.length:
+                return result
+            char = self.text[self.pos]
+            if char == "]":
+                self.pos += 1
+                return result
+            if char in ",}":
+                self.pos += 1
+                continue
+            result.append(self.value(_ARRAY_VALUE))
+
+
+def _error_call(reason: str, original: str) -> dict:
+    return {
+        "name": SANITIZE_ERROR_NAME,
+        "arguments": {
+            "error": f"Failed to parse JSON: {reason}",
+            "original": original[:100] + "..." if len(original) > 100 else original,
+        },
+    }
+
+
+def _normalize_call(call, original: str) -> dict:
+    if not isinstance(call, dict) or not isinstance(call.get("name"), str):
+        return _error_call("expected an object with a function name", original)
+    arguments = call.get("arguments", call.get("parameters", {}))
+    if isinstance(arguments, str):
+        # Arguments serialized as a string, like in native function calling
+        arguments = parse_json(arguments) if arguments.strip() else {}
+    if arguments is None:
+        arguments = {}
+    if not isinstance(arguments, dict):
+        return _error_call("the arguments must be an object", original)
+    return {"name": call["name"], "arguments": arguments}
+
+
+def parse_json(text: str):
+    # Valid JSON takes the C parser, anything else one tolerant pass from the first object or array
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        pass
+    starts = [index for index in (text.find("{"), text.find("[")) if index != -1]
+    parser = _Parser(text)
+    parser.pos = min(starts) if starts else 0
+    return parser.value()
+
+
+def parse_tool_calls(text: str) -> list[dict]:
+    # A single call or a list of calls, each as {"name": ..., "arguments": {...}}
+    try:
+        parsed = parse_json(text)
+    except Exception as e:
+        return [_error_call(str(e), text)]
+    if isinstance(parsed, list):
+        return [_normalize_call(call, text) for call in parsed] or [
+            _error_call("empty list of function calls", text)
+        ]
+    return [_normalize_call(parsed, text)]
+
+
+def parse_tool_call(text: str) -> dict:
+    return parse_tool_calls(text)[0]
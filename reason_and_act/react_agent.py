@@ -1,11 +1,23 @@
 from model.base_llm import BaseLLM
-from model.utils import create_message, add_message_to_history, TYPE_DICTIONARY
+from model.cascade_llm import escalate
+from model.chat_history import ChatHistory
+from model.tokens import get_history_token_budget
+from model.utils import (
+    create_message,
+    TagStreamCollector,
+)
 from tool_use.llm_tool import LLMTool
+from tool_use.observation import ObservationFormatter
+from tool_use.tool_index import ToolIndex
+from tool_use.process_pool import EXECUTION_INLINE
+from tool_use.tool_executor import invoke_tools, ainvoke_tools, SpeculativeToolCalls
 from tool_use.utils import (
     TOOLS_DEFINITIONS_TAG,
     TOOLS_DEFINITIONS_TAG_END,
     TOOLS_INVOCATIONS_TAG,
     TOOLS_INVOCATIONS_TAG_END,
+    PROMPT_CACHE_SIZE,
+    compile_tool_definitions,
 )
 from reason_and_act.utils import (
     RESPONSE_TAG,
@@ -16,11 +28,23 @@ from reason_and_act.utils import (
     THOUGHT_TAG_END,
     QUERY_TAG,
     QUERY_TAG_END,
-    sanitize_json_string,
 )
+from reason_and_act.call_tracker import CallTracker
+from reason_and_act.json_repair import SANITIZE_ERROR_NAME, parse_tool_calls
+from reason_and_act.step_parser import (
+    Step,
+    StepParser,
+    STEP_ANSWER,
+    STEP_CALL,
+    STEP_THOUGHT,
+    parse_steps,
+    step_contents,
+)
+from collections import OrderedDict
+import asyncio
 import json
-import re
-import ast
+import logging
+import threading
 
 
 class ReactAgent:
@@ -29,11 +53,44 @@ class ReactAgent:
         llm: BaseLLM,
         tools: list[LLMTool],
         backstory_prompt: str = "",
+        stream: bool = False,
+        escalate_after_steps: int = 5,
+        history_token_budget: int | None = None,
+        native_tools: bool = False,
+        max_prompt_tools: int | None = None,
+        speculative_tools: bool = False,
+        observation_formatter: ObservationFormatter | None = None,
     ):
         self.llm = llm
-        self.tools = tools
-        self.tools_dict = {tool.name: tool for tool in tools}
         self.backstory_prompt = backstory_prompt
+        # Native mode passes tools as JSON schemas and reads structured tool calls instead of XML tags
+        self.native_tools = native_tools
+        # With large registries only the tools most relevant to the query are put into the prompt
+        self.max_prompt_tools = max_prompt_tools
+        # Token budget for observations and thoughts kept in the prompt, defaults to the model budget
+        self.history_token_budget = history_token_budget or get_history_token_budget(
+            llm.model_name
+        )
+        # Keeps every function result within its token budget, so one large output does not inflate later prompts
+        self.observation_formatter = observation_formatter or ObservationFormatter(
+            model_name=llm.model_name
+        )
+        # Streaming stops as soon as an answer or the last of consecutive function calls is closed
+        self.stream = stream
+        # Start each streamed function call as soon as its closing tag arrives, only for XML mode streaming.
+        # Calls the final parse does not confirm are discarded, so use it for tools without side effects
+        self.speculative_tools = speculative_tools and stream and not native_tools
+        self.stream_stop_tags = {
+            RESPONSE_TAG_END: (),
+            TOOLS_INVOCATIONS_TAG_END: (TOOLS_INVOCATIONS_TAG,),
+        }
+        # A CascadeLLM is escalated to its large model after this many steps without an answer
+        self.escalate_after_steps = escalate_after_steps
+        # Repeated function calls are answered from the session, these count what that saved across sessions
+        self.served_repeated_calls = 0
+        self.saved_llm_calls = 0
+        # Sessions of one agent can run in parallel threads
+        self._counter_lock = threading.Lock()
         self.agent_system_prompt = f"""You are a planning and function-calling AI model.
 You can only generate the following steps:
 - thought: use the {THOUGHT_TAG}{THOUGHT_TAG_END} XML tags to plan the next steps and make function calls with values you have available, so you can obtain more data to call other functions with
@@ -51,6 +108,14 @@ Here are the available functions:
 """
         self.tool_results_prompt = f"""Always check if the function has already been called and the results are in the {OBSERVATION_TAG}{OBSERVATION_TAG_END} XML tags.
 If you have enough information to answer the user query, you must do so within {RESPONSE_TAG}{RESPONSE_TAG_END} XML tags, without referring to any functions!"""
+        self.native_agent_system_prompt = f"""You are a planning and function-calling AI model.
+You can only generate the following steps:
+- thought: use the {THOUGHT_TAG}{THOUGHT_TAG_END} XML tags to plan the next steps and make function calls with values you have available, so you can obtain more data to call other functions with
+- function calls: call the provided functions to request more information, which will be given to you as observation in {OBSERVATION_TAG}{OBSERVATION_TAG_END} XML tags
+- answer: use the {RESPONSE_TAG}{RESPONSE_TAG_END} XML tags to deliver the final answer
+You operate in a loop between the thought, function calls and observation steps - advancing one step at a time. When you have enough data to provide the final answer you can do so at any step.
+Call one or more functions to assist with the user query without making assumptions about argument values.
+"""
         self.one_shot_prompt = f"""
 Example user query:
 {QUERY_TAG}What's the temperature in London?{QUERY_TAG_END}
@@ -70,48 +135,24 @@ You have enough information and must provide the final answer:
 Additional instructions:
 Always aim to answer the user query fully, but if the user query cannot be answered with provided tools, respond freely within {RESPONSE_TAG}{RESPONSE_TAG_END} XML tags.
 """
+        self.set_tools(tools)
 
-    def _extract_response_content(
-        self, text: str, tag: str, tag_end: str, allow_no_tags: bool = False
-    ) -> list:
-        # Find content between the tags using regex
-        tag_pattern = rf"{tag}(.*?){tag_end}"
-        matched_contents = re.findall(tag_pattern, text, re.DOTALL)
-        if not matched_contents and allow_no_tags:
-            return [text]
-        # Strip leading and trailing whitespace or return "" if empty
-        content = [content.strip() for content in matched_contents]
-        return content
-
-    def _convert_tool_arguments(self, tool_call: dict, tool_signature: dict) -> dict:
-        # Iterate over all arguments in tool call
-        for arg_name, arg_value in tool_call["arguments"].items():
-            # if tool_signature["parameters"] does not contain arg_name, raise exception
-            if arg_name not in tool_signature["parameters"]:
-                raise Exception(
-                    f"Function {tool_call['name']} does not have argument {arg_name}. Call it with those arguments: {list(tool_signature['parameters'].keys())}"
-                )
-            param_type = tool_signature["parameters"][arg_name]
-            # Convert the argument value to the correct type if needed
-            if not isinstance(arg_value, TYPE_DICTIONARY[param_type]):
-                param_value = TYPE_DICTIONARY[param_type](arg_value)
-                tool_call["arguments"][arg_name] = param_value
-
-        return tool_call
-
-    def _handle_tool_calls(self, tool_calls: list) -> dict:
-        tool_results = {}
-        tool_calls_list_of_lists = [
-            ast.literal_eval(t) if t.startswith("[") else [t] for t in tool_calls
-        ]
-        tool_calls_flat = [
-            item for sublist in tool_calls_list_of_lists for item in sublist
+    def _parse_tool_calls(self, tool_calls: list) -> list[dict]:
+        # Each block holds one call or a list of calls, malformed ones are repaired in one pass
+        return [
+            tool_call_dict
+            for tool_call in tool_calls
+            for tool_call_dict in parse_tool_calls(tool_call)
         ]
+
+    def _prepare_tool_calls(
+        self, tool_call_dicts: list[dict]
+    ) -> tuple[dict, list[tuple[int, LLMTool, dict]]]:
+        errors = {}
+        invocations = []
         counter = 0
-        for tc in tool_calls_flat:
+        for tool_call_dict in tool_call_dicts:
             counter += 1
-            sanitised_tc = sanitize_json_string(tc)
-            tool_call_dict = json.loads(sanitised_tc)
             try:
                 # Get the tool from the dictionary
                 if tool_call_dict["name"] not in self.tools_dict:
@@ -120,93 +161,493 @@ Always aim to answer the user query fully, but if the user query cannot be answe
                     )
                 tool = self.tools_dict[tool_call_dict["name"]]
                 # Convert any arguments to the correct type
-                tool_call = self._convert_tool_arguments(
-                    tool_call_dict, json.loads(tool.description)
-                )
-                # Invoke the tool using the tool call data
-                result = tool.invoke(**tool_call["arguments"])
+                arguments = tool.coerce_arguments(tool_call_dict["arguments"])
+                invocations.append((counter, tool, arguments))
             except Exception as e:
                 # get message from exception
-                result = str(e)
-            # Store the result for the tool call
-            # tool_results[tc] = result
-            tool_results[counter] = result
+                errors[counter] = str(e)
+        return errors, invocations
 
-        return tool_results
+    def _collect_tool_results(
+        self, errors: dict, invocations: list, results: list
+    ) -> dict:
+        tool_results = dict(errors)
+        for (counter, _, _), result in zip(invocations, results):
+            # get message from exception
+            tool_results[counter] = (
+                str(result) if isinstance(result, Exception) else result
+            )
+        # Keep the order of the calls, so the observation is deterministic
+        return dict(sorted(tool_results.items()))
 
-    def generate(self, user_msg: str, max_steps: int = 10) -> str:
-        tool_definitions = "\n".join(
-            [
-                TOOLS_DEFINITIONS_TAG,
-                ",\n\n".join(
-                    [
-                        tool.description.encode().decode("unicode_escape")
-                        for tool in self.tools
-                    ]
-                ),
-                TOOLS_DEFINITIONS_TAG_END,
-            ]
-        )
-        # Assemble the full prompt
-        complete_tool_agent_prompt = f"{self.backstory_prompt}\n{self.agent_system_prompt}\n{tool_definitions}\n{self.tool_results_prompt}\n{self.one_shot_prompt}"
-        # Initialize the chat history with tool definitions
-        react_chat_history = [
-            create_message(complete_tool_agent_prompt, "system"),
-            create_message(f"{QUERY_TAG}{user_msg}{QUERY_TAG_END}", "user"),
+    def _claim_speculative_calls(
+        self, invocations: list, speculation: SpeculativeToolCalls | None
+    ) -> tuple[dict, list]:
+        # Calls already started while streaming are only awaited, the others are invoked now
+        claimed = {}
+        if speculation is not None:
+            for counter, tool, arguments in invocations:
+                call = speculation.claim(tool, arguments)
+                if call is not None:
+                    claimed[counter] = call
+        pending = [
+            invocation for invocation in invocations if invocation[0] not in claimed
+        ]
+        return claimed, pending
+
+    def _format_observations(self, invocations: list, results: dict) -> list:
+        # Errors are short and kept as they are, results are cut down to their budget
+        return [
+            (
+                results[counter]
+                if isinstance(results[counter], Exception)
+                else self.observation_formatter.format(
+                    tool, arguments, results[counter]
+                )
+            )
+            for counter, tool, arguments in invocations
         ]
+
+    async def _aformat_observations(self, invocations: list, results: dict) -> list:
+        # Oversized results of one step are summarized concurrently
+        return list(
+            await asyncio.gather(
+                *[
+                    self._aformat_observation(tool, arguments, results[counter])
+                    for counter, tool, arguments in invocations
+                ]
+            )
+        )
+
+    async def _aformat_observation(self, tool: LLMTool, arguments: dict, result):
+        if isinstance(result, Exception):
+            return result
+        return await self.observation_formatter.aformat(tool, arguments, result)
+
+    def _serve_repeated_calls(
+        self, invocations: list, call_tracker: CallTracker | None
+    ) -> tuple[dict, list]:
+        # Calls with the same name and arguments as earlier in the session are not invoked again
+        if call_tracker is None:
+            return {}, invocations
+        served, to_invoke = call_tracker.serve(invocations)
+        with self._counter_lock:
+            self.served_repeated_calls += len(served)
+        return served, to_invoke
+
+    def _execute_tool_calls(
+        self,
+        tool_call_dicts: list[dict],
+        speculation: SpeculativeToolCalls | None = None,
+        call_tracker: CallTracker | None = None,
+    ) -> dict:
+        errors, invocations = self._prepare_tool_calls(tool_call_dicts)
+        results, to_invoke = self._serve_repeated_calls(invocations, call_tracker)
+        claimed, pending = self._claim_speculative_calls(to_invoke, speculation)
+        # Invoke all tools of this step concurrently
+        results.update(
+            zip(
+                [counter for counter, _, _ in pending],
+                invoke_tools([(tool, arguments) for _, tool, arguments in pending]),
+            )
+        )
+        for counter, call in claimed.items():
+            results[counter] = speculation.result(call)
+        if call_tracker is not None:
+            call_tracker.record(invocations, results)
+        return self._collect_tool_results(
+            errors, invocations, self._format_observations(invocations, results)
+        )
+
+    async def _aexecute_tool_calls(
+        self,
+        tool_call_dicts: list[dict],
+        speculation: SpeculativeToolCalls | None = None,
+        call_tracker: CallTracker | None = None,
+    ) -> dict:
+        errors, invocations = self._prepare_tool_calls(tool_call_dicts)
+        results, to_invoke = self._serve_repeated_calls(invocations, call_tracker)
+        claimed, pending = self._claim_speculative_calls(to_invoke, speculation)
+        # Invoke all tools of this step concurrently
+        pending_results, *claimed_results = await asyncio.gather(
+            ainvoke_tools([(tool, arguments) for _, tool, arguments in pending]),
+            *[speculation.aresult(call) for call in claimed.values()],
+        )
+        results.update(zip([counter for counter, _, _ in pending], pending_results))
+        results.update(zip(claimed, claimed_results))
+        if call_tracker is not None:
+            call_tracker.record(invocations, results)
+        return self._collect_tool_results(
+            errors, invocations, await self._aformat_observations(invocations, results)
+        )
+
+    def _handle_tool_calls(self, tool_calls: list) -> dict:
+        return self._execute_tool_calls(self._parse_tool_calls(tool_calls))
+
+    def _parse_native_tool_calls(self, tool_calls: list[dict]) -> list[dict]:
+        tool_call_dicts = []
+        for tool_call in tool_calls:
+            try:
+                arguments = json.loads(tool_call["arguments"] or "{}")
+            except json.JSONDecodeError as e:
+                # Same shape as the parse_tool_calls fallback, so it is handled the same way
+                tool_call_dicts.append(
+                    {
+                        "name": SANITIZE_ERROR_NAME,
+                        "arguments": {
+                            "error": f"Failed to parse JSON: {str(e)}",
+                            "original": tool_call["arguments"],
+                        },
+                    }
+                )
+                continue
+            tool_call_dicts.append({"name": tool_call["name"], "arguments": arguments})
+        return tool_call_dicts
+
+    def _is_malformed(self, tool_call_dicts: list[dict]) -> bool:
+        return any(tc.get("name") == SANITIZE_ERROR_NAME for tc in tool_call_dicts)
+
+    def _compile_prompt(self, tools: tuple[LLMTool, ...]) -> tuple[dict, list[dict]]:
+        # Assemble the full prompt once per tool selection, it is identical for every session using it
+        if self.native_tools:
+            # Tool definitions travel as JSON schemas, so the prompt skips them and the XML examples
+            complete_tool_agent_prompt = f"{self.backstory_prompt}\n{self.native_agent_system_prompt}\n{self.tool_results_prompt}"
+        else:
+            complete_tool_agent_prompt = f"{self.backstory_prompt}\n{self.agent_system_prompt}\n{compile_tool_definitions(tools)}\n{self.tool_results_prompt}\n{self.one_shot_prompt}"
+        return (
+            create_message(complete_tool_agent_prompt, "system"),
+            [tool.json_schema for tool in tools],
+        )
+
+    def _compile_prompts(self):
+        self._prompt_cache = OrderedDict()
+        self.system_message, self.tool_schemas = self._compile_prompt(self.tools)
+
+    def _select_prompt(self, user_msg: str) -> tuple[dict, list[dict]]:
+        if self.max_prompt_tools is None or len(self.tools) <= self.max_prompt_tools:
+            return self.system_message, self.tool_schemas
+        selected = self.tool_index.search(user_msg, self.max_prompt_tools)
+        # Registration order keeps the prompt byte-stable for the same selection
+        selected_names = {tool.name for tool in (*selected, *self._builtin_tools())}
+        tools = tuple(tool for tool in self.tools if tool.name in selected_names)
+        key = tuple(tool.name for tool in tools)
+        if key not in self._prompt_cache:
+            self._prompt_cache[key] = self._compile_prompt(tools)
+            if len(self._prompt_cache) > PROMPT_CACHE_SIZE:
+                self._prompt_cache.popitem(last=False)
+        self._prompt_cache.move_to_end(key)
+        return self._prompt_cache[key]
+
+    def _builtin_tools(self) -> tuple[LLMTool, ...]:
+        # With a blob store the model needs read_blob to page through stored results
+        blob_store = self.observation_formatter.blob_store
+        return (blob_store.read_tool,) if blob_store is not None else ()
+
+    def set_tools(self, tools: list[LLMTool]):
+        builtin_tools = self._builtin_tools()
+        self.tools = (
+            *[tool for tool in tools if tool not in builtin_tools],
+            *builtin_tools,
+        )
+        self.tools_dict = {tool.name: tool for tool in self.tools}
+        self.tool_index = ToolIndex(self.tools)
+        self._compile_prompts()
+
+    def add_tools(self, tools: list[LLMTool]):
+        self.tools = (*self.tools, *tools)
+        for tool in tools:
+            self.tools_dict[tool.name] = tool
+            # Only the new tools are indexed
+            self.tool_index.add(tool)
+        self._compile_prompts()
+
+    def _init_chat_history(self, user_msg: str, system_message: dict) -> ChatHistory:
+        # Initialize the chat history with the shared system message
+        react_chat_history = ChatHistory(
+            2, 100, self.history_token_budget, self.llm.model_name
+        )
+        react_chat_history.add(system_message)
+        react_chat_history.add(
+            create_message(f"{QUERY_TAG}{user_msg}{QUERY_TAG_END}", "user")
+        )
+        return react_chat_history
+
+    def _speculate(
+        self,
+        step_parser: StepParser,
+        chunk: str,
+        collector: TagStreamCollector,
+        call_tracker: CallTracker | None = None,
+    ) -> list[tuple[LLMTool, dict]]:
+        # Valid function calls closed by this chunk, inline tools are cheap enough to wait for the final parse,
+        # batch tools are grouped there and calls answered earlier in the session are served from it instead
+        speculative_calls = []
+        # Text past the point where the stream stops is not part of the response
+        response_end = len(collector.result())
+        for step in step_parser.feed(chunk):
+            if step.kind != STEP_CALL or step.end > response_end:
+                continue
+            _, invocations = self._prepare_tool_calls(parse_tool_calls(step.content))
+            speculative_calls.extend(
+                (tool, arguments)
+                for _, tool, arguments in invocations
+                if tool.execution != EXECUTION_INLINE
+                and tool.batch_function is None
+                and (call_tracker is None or not call_tracker.known(tool, arguments))
+            )
+        return speculative_calls
+
+    def _generate_response(
+        self,
+        llm: BaseLLM,
+        react_chat_history: ChatHistory,
+        speculation: SpeculativeToolCalls | None = None,
+        call_tracker: CallTracker | None = None,
+    ) -> str:
+        if not self.stream:
+            return llm.generate(react_chat_history.to_messages())
+        collector = TagStreamCollector(self.stream_stop_tags)
+        step_parser = StepParser()
+        chunks = llm.generate_stream(react_chat_history.to_messages())
+        try:
+            for chunk in chunks:
+                stop = collector.feed(chunk)
+                if speculation is not None:
+                    for tool, arguments in self._speculate(
+                        step_parser, chunk, collector, call_tracker
+                    ):
+                        speculation.start(tool, arguments)
+                if stop:
+                    break
+        finally:
+            # Closing the stream early cancels the upstream request
+            chunks.close()
+        return collector.result()
+
+    async def _agenerate_response(
+        self,
+        llm: BaseLLM,
+        react_chat_history: ChatHistory,
+        speculation: SpeculativeToolCalls | None = None,
+        call_tracker: CallTracker | None = None,
+    ) -> str:
+        if not self.stream:
+            return await llm.agenerate(react_chat_history.to_messages())
+        collector = TagStreamCollector(self.stream_stop_tags)
+        step_parser = StepParser()
+        chunks = llm.agenerate_stream(react_chat_history.to_messages())
+        try:
+            async for chunk in chunks:
+                stop = collector.feed(chunk)
+                if speculation is not None:
+                    for tool, arguments in self._speculate(
+                        step_parser, chunk, collector, call_tracker
+                    ):
+                        speculation.astart(tool, arguments)
+                if stop:
+                    break
+        finally:
+            # Closing the stream early cancels the upstream request
+            await chunks.aclose()
+        return collector.result()
+
+    def _generate_step(
+        self,
+        llm: BaseLLM,
+        react_chat_history: ChatHistory,
+        tool_schemas: list[dict],
+        speculation: SpeculativeToolCalls | None = None,
+        call_tracker: CallTracker | None = None,
+    ) -> tuple[list[Step], list[dict]]:
+        # Returns the steps of the response and the function calls it requested
+        if self.native_tools:
+            response, tool_calls = llm.generate_tool_calls(
+                react_chat_history.to_messages(), tool_schemas
+            )
+            return parse_steps(response), self._parse_native_tool_calls(tool_calls)
+        steps = parse_steps(
+            self._generate_response(llm, react_chat_history, speculation, call_tracker)
+        )
+        return steps, self._parse_tool_calls(step_contents(steps, STEP_CALL))
+
+    async def _agenerate_step(
+        self,
+        llm: BaseLLM,
+        react_chat_history: ChatHistory,
+        tool_schemas: list[dict],
+        speculation: SpeculativeToolCalls | None = None,
+        call_tracker: CallTracker | None = None,
+    ) -> tuple[list[Step], list[dict]]:
+        # Returns the steps of the response and the function calls it requested
+        if self.native_tools:
+            response, tool_calls = await llm.agenerate_tool_calls(
+                react_chat_history.to_messages(), tool_schemas
+            )
+            return parse_steps(response), self._parse_native_tool_calls(tool_calls)
+        steps = parse_steps(
+            await self._agenerate_response(
+                llm, react_chat_history, speculation, call_tracker
+            )
+        )
+        return steps, self._parse_tool_calls(step_contents(steps, STEP_CALL))
+
+    def _add_observation(self, react_chat_history: ChatHistory, tool_results: dict):
+        # Sometimes more humanised responses result in more accurate answers
+        tool_results_humanised = "\n".join(
+            str(result) for result in tool_results.values()
+        )
+        tool_message = create_message(
+            f"{OBSERVATION_TAG}\n{tool_results_humanised}\n{OBSERVATION_TAG_END}",
+            "user",
+        )
+        react_chat_history.add(tool_message)
+
+    def _add_thought(self, react_chat_history: ChatHistory, steps: list[Step]):
+        # If we got a thought then add it to chat history
+        thought_content = step_contents(steps, STEP_THOUGHT)
+        if thought_content:
+            thought_msg = create_message(
+                f"{THOUGHT_TAG}\n{thought_content}\n{THOUGHT_TAG_END}", "assistant"
+            )
+            react_chat_history.add(thought_msg)
+
+    def _add_repeat_nudge(
+        self, react_chat_history: ChatHistory, call_tracker: CallTracker
+    ):
+        if call_tracker.oscillating:
+            reason = "You are going back and forth between the same function calls."
+        else:
+            reason = "You already made these function calls with the same arguments."
+        react_chat_history.add(
+            create_message(
+                f"{reason} Their results are in the observations above, calling them again will not change them. Use them to call other functions or provide the final answer within {RESPONSE_TAG}{RESPONSE_TAG_END} XML tags.",
+                "user",
+            )
+        )
+
+    def _stop_repeating(
+        self, call_tracker: CallTracker, counter: int, max_steps: int
+    ) -> bool:
+        # Only repeats since the last nudge, so skip the remaining steps and answer with what we have
+        if not call_tracker.stuck:
+            return False
+        with self._counter_lock:
+            self.saved_llm_calls += max_steps - counter
+        logging.info(
+            f"Function calls repeated for {call_tracker.repeated_steps} steps, answering after step {counter}: "
+            f"saved {max_steps - counter} LLM calls, served {call_tracker.served} repeated calls"
+        )
+        return True
+
+    def _add_final_instruction(self, react_chat_history: ChatHistory):
+        react_chat_history.add(
+            create_message(
+                "You now have to provide a final response based on all the information provided without the use of any functions or thoughts.",
+                "user",
+            )
+        )
+
+    def generate(self, user_msg: str, max_steps: int = 10) -> str:
+        # Session-local LLM, so escalating does not affect other sessions of this agent
+        llm = self.llm
+        system_message, tool_schemas = self._select_prompt(user_msg)
+        react_chat_history = self._init_chat_history(user_msg, system_message)
+        # Session-local, so results are only served again to the conversation that saw them
+        call_tracker = CallTracker()
         counter = 0
         while self.tools and counter < max_steps:
             counter += 1
-            # Generate a response
-            response = self.llm.generate(react_chat_history)
-            # If we got tool calls then handle them
-            tool_call_content = self._extract_response_content(
-                response, TOOLS_INVOCATIONS_TAG, TOOLS_INVOCATIONS_TAG_END
-            )
-            if tool_call_content:
-                # tool_call_msg = create_message(
-                #     f"{TOOLS_INVOCATIONS_TAG}\n{tool_call_content}\n{TOOLS_INVOCATIONS_TAG_END}",
-                #     "assistant",
-                # )
-                # Not adding the tool call itself can save tokens
-                # add_message_to_history(react_chat_history, tool_call_msg, 2, 100)
-                # Handle the tool calls
-                tool_results = self._handle_tool_calls(tool_call_content)
-                # Sometimes more humanised responses result in more accurate answers
-                tool_results_humanised = "\n".join(tool_results.values())
-                tool_message = create_message(
-                    f"{OBSERVATION_TAG}\n{tool_results_humanised}\n{OBSERVATION_TAG_END}",
-                    "user",
+            # Generate a response, function calls may already run while it streams
+            speculation = SpeculativeToolCalls() if self.speculative_tools else None
+            repeated = False
+            try:
+                steps, tool_call_dicts = self._generate_step(
+                    llm, react_chat_history, tool_schemas, speculation, call_tracker
                 )
-                add_message_to_history(react_chat_history, tool_message, 2, 100)
+                # If we got tool calls then handle them
+                if tool_call_dicts:
+                    # tool_call_msg = create_message(
+                    #     f"{TOOLS_INVOCATIONS_TAG}\n{tool_call_content}\n{TOOLS_INVOCATIONS_TAG_END}",
+                    #     "assistant",
+                    # )
+                    # Not adding the tool call itself can save tokens
+                    # react_chat_history.add(tool_call_msg)
+                    # Handle the tool calls
+                    if self._is_malformed(tool_call_dicts):
+                        llm = escalate(llm, "malformed function call")
+                    tool_results = self._execute_tool_calls(
+                        tool_call_dicts, speculation, call_tracker
+                    )
+                    self._add_observation(react_chat_history, tool_results)
+                    repeated = call_tracker.repeated
+            finally:
+                if speculation is not None:
+                    # Drop the calls the final response did not confirm, also when the step failed
+                    speculation.discard()
             # If we got a response then return it
-            response_content = self._extract_response_content(
-                response, RESPONSE_TAG, RESPONSE_TAG_END
-            )
+            response_content = step_contents(steps, STEP_ANSWER)
             if response_content:
                 return response_content[-1]
-            # If we got a thought then add it to chat history
-            thought_content = self._extract_response_content(
-                response, THOUGHT_TAG, THOUGHT_TAG_END
-            )
-            if thought_content:
-                thought_msg = create_message(
-                    f"{THOUGHT_TAG}\n{thought_content}\n{THOUGHT_TAG_END}", "assistant"
+            self._add_thought(react_chat_history, steps)
+            if repeated:
+                if self._stop_repeating(call_tracker, counter, max_steps):
+                    break
+                self._add_repeat_nudge(react_chat_history, call_tracker)
+            if counter == self.escalate_after_steps:
+                llm = escalate(llm, f"no answer after {counter} steps")
+
+        # Generate a final response
+        self._add_final_instruction(react_chat_history)
+        final_response = self._generate_response(llm, react_chat_history)
+        final_response_content = step_contents(parse_steps(final_response), STEP_ANSWER)
+        # Without answer tags the whole response is the answer
+        return final_response_content[-1] if final_response_content else final_response
+
+    async def agenerate(self, user_msg: str, max_steps: int = 10) -> str:
+        # Session-local LLM, so escalating does not affect other sessions of this agent
+        llm = self.llm
+        system_message, tool_schemas = self._select_prompt(user_msg)
+        react_chat_history = self._init_chat_history(user_msg, system_message)
+        # Session-local, so results are only served again to the conversation that saw them
+        call_tracker = CallTracker()
+        counter = 0
+        while self.tools and counter < max_steps:
+            counter += 1
+            # Generate a response without blocking the event loop, function calls may already run while it streams
+            speculation = SpeculativeToolCalls() if self.speculative_tools else None
+            repeated = False
+            try:
+                steps, tool_call_dicts = await self._agenerate_step(
+                    llm, react_chat_history, tool_schemas, speculation, call_tracker
                 )
-                add_message_to_history(react_chat_history, thought_msg, 2, 100)
+                # If we got tool calls then handle them
+                if tool_call_dicts:
+                    if self._is_malformed(tool_call_dicts):
+                        llm = escalate(llm, "malformed function call")
+                    tool_results = await self._aexecute_tool_calls(
+                        tool_call_dicts, speculation, call_tracker
+                    )
+                    self._add_observation(react_chat_history, tool_results)
+                    repeated = call_tracker.repeated
+            finally:
+                if speculation is not None:
+                    # Drop the calls the final response did not confirm, also when the step failed
+                    speculation.discard()
+            # If we got a response then return it
+            response_content = step_contents(steps, STEP_ANSWER)
+            if response_content:
+                return response_content[-1]
+            self._add_thought(react_chat_history, steps)
+            if repeated:
+                if self._stop_repeating(call_tracker, counter, max_steps):
+                    break
+                self._add_repeat_nudge(react_chat_history, call_tracker)
+            if counter == self.escalate_after_steps:
+                llm = escalate(llm, f"no answer after {counter} steps")
 
         # Generate a final response
-        add_message_to_history(
-            react_chat_history,
-            create_message(
-                "You now have to provide a final response based on all the information provided without the use of any functions or thoughts.",
-                "user",
-            ),
-            2,
-            100,
-        )
-        final_response = self.llm.generate(react_chat_history)
-        final_response_content = self._extract_response_content(
-            final_response, RESPONSE_TAG, RESPONSE_TAG_END, True
-        )
-        return final_response_content[-1]
+        self._add_final_instruction(react_chat_history)
+        final_response = await self._agenerate_response(llm, react_chat_history)
+        final_response_content = step_contents(parse_steps(final_response), STEP_ANSWER)
+        # Without answer tags the whole response is the answer
+        return final_response_content[-1] if final_response_content else final_response
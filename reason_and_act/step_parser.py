@@ -0,0 +1,136 @@
+import re
+from functools import lru_cache
+
+from reason_and_act.utils import (
+    THOUGHT_TAG,
+    THOUGHT_TAG_END,
+    RESPONSE_TAG,
+    RESPONSE_TAG_END,
+)
+from tool_use.utils import TOOLS_INVOCATIONS_TAG, TOOLS_INVOCATIONS_TAG_END
+
+STEP_THOUGHT = "thought"
+STEP_CALL = "call"
+STEP_ANSWER = "answer"
+# Step kind -> (opening tag, closing tag) of a ReAct response
+REACT_STEP_TAGS = {
+    STEP_THOUGHT: (THOUGHT_TAG, THOUGHT_TAG_END),
+    STEP_CALL: (TOOLS_INVOCATIONS_TAG, TOOLS_INVOCATIONS_TAG_END),
+    STEP_ANSWER: (RESPONSE_TAG, RESPONSE_TAG_END),
+}
+
+
+class Step:
+    __slots__ = ("kind", "content", "start", "end")
+
+    def __init__(self, kind: str, content: str, start: int, end: int):
+        self.kind = kind
+        # Text between the tags without surrounding whitespace
+        self.content = content
+        # Span of the whole block including its tags
+        self.start = start
+        self.end = end
+
+    def __repr__(self) -> str:
+        return f"Step({self.kind!r}, {self.content!r}, {self.start}, {self.end})"
+
+
+@lru_cache(maxsize=None)
+def _compile_open_pattern(tags: tuple) -> re.Pattern:
+    # One alternation over every opening tag, the matched group names the step kind
+    return re.compile(
+        "|".join(f"(?P<{kind}>{re.escape(open_tag)})" for kind, (open_tag, _) in tags)
+    )
+
+
+class StepParser:
+    def __init__(self, tags: dict[str, tuple[str, str]] = REACT_STEP_TAGS):
+        self.tags = tags
+        self._open_pattern = _compile_open_pattern(tuple(tags.items()))
+        self._longest_open_tag = max(len(open_tag) for open_tag, _ in tags.values())
+        self.text = ""
+        self.steps: list[Step] = []
+        # Text before this position is fully parsed
+        self._pos = 0
+        # Block whose closing tag has not arrived yet: (kind, start, content start)
+        self._pending = None
+        self._open_from = 0
+        self._close_from = 0
+
+    def _next_step(self, final: bool) -> Step | None:
+        while True:
+            if self._pending is None:
+                match = self._open_pattern.search(
+                    self.text, max(self._pos, self._open_from)
+                )
+                if match is None:
+                    # Only rescan the tail that may hold a partially received opening tag
+                    self._open_from = len(self.text) - self._longest_open_tag + 1
+                    return None
+                self._pending = (match.lastgroup, match.start(), match.end())
+                self._close_from = match.end()
+            kind, start, content_start = self._pending
+            close_tag = self.tags[kind][1]
+            close_index = self.text.find(close_tag, self._close_from)
+            if close_index != -1:
+                break
+            if not final:
+                # Only rescan the tail that may hold a partially received closing tag
+                self._close_from = max(
+                    content_start, len(self.text) - len(close_tag) + 1
+                )
+                return None
+            # The block never closes, so its opening tag is plain text
+            self._pending = None
+            self._pos = start + 1
+        self._pending = None
+        self._pos = close_index + len(close_tag)
+        return Step(
+            kind, self.text[content_start:close_index].strip(), start, self._pos
+        )
+
+    def _parse(self, final: bool) -> list[Step]:
+        steps = []
+        step = self._next_step(final)
+        while step is not None:
+            steps.append(step)
+            step = self._next_step(final)
+        self.steps.extend(steps)
+        return steps
+
+    def feed(self, chunk: str) -> list[Step]:
+        # Returns the steps completed by this chunk, in response order
+        self.text += chunk
+        return self._parse(False)
+
+    def finish(self) -> list[Step]:
+        # Returns the steps found once blocks that never closed are skipped
+        return self._parse(True)
+
+
+def parse_steps(
+    text: str, tags: dict[str, tuple[str, str]] = REACT_STEP_TAGS
+) -> list[Step]:
+    # Single pass over a complete response, each block costs one tag search and one find
+    open_pattern = _compile_open_pattern(tuple(tags.items()))
+    steps = []
+    pos = 0
+    match = open_pattern.search(text)
+    while match is not None:
+        kind = match.lastgroup
+        close_tag = tags[kind][1]
+        close_index = text.find(close_tag, match.end())
+        if close_index == -1:
+            # The block never closes, so its opening tag is plain text
+            pos = match.start() + 1
+        else:
+            pos = close_index + len(close_tag)
+            steps.append(
+                Step(kind, text[match.end() : close_index].strip(), match.start(), pos)
+            )
+        match = open_pattern.search(text, pos)
+    return steps
+
+
+def step_contents(steps: list[Step], kind: str) -> list[str]:
+    return [step.content for step in steps if step.kind == kind]
@@ -1,13 +1,27 @@
 from model.base_llm import BaseLLM
-from model.utils import create_message, add_message_to_history
+from model.cascade_llm import escalate
+from model.chat_history import ChatHistory
+from model.tokens import get_history_token_budget
+from model.utils import create_message
 import logging
 
 DONE_SEQUENCE = "<!DONE!>"
 
 
 class ReflectionAgent:
-    def __init__(self, llm: BaseLLM):
+    def __init__(
+        self,
+        llm: BaseLLM,
+        escalate_after_steps: int = 2,
+        history_token_budget: int | None = None,
+    ):
         self.llm = llm
+        # Token budget for drafts and critiques kept in the prompt, defaults to the model budget
+        self.history_token_budget = history_token_budget or get_history_token_budget(
+            llm.model_name
+        )
+        # A CascadeLLM is escalated to its large model after this many critiques without approval
+        self.escalate_after_steps = escalate_after_steps
         self.generation_system_prompt = """You are an expert content generator. Your goal is to produce the highest-quality content that fully satisfies the user's request.
 - If the user provides feedback or critique, revise your previous output accordingly.
 - Always output the complete, improved version based on the latest input.
@@ -17,38 +31,80 @@ class ReflectionAgent:
 - Provide a clear, concise list of critiques and actionable recommendations.
 - If the content is satisfactory and requires no changes, only then respond with: {DONE_SEQUENCE}"""
 
-    def generate(self, user_msg: str, max_steps: int = 10) -> str:
-        generation_history = [
-            create_message(self.generation_system_prompt, "system"),
-            create_message(user_msg, "user"),
-        ]
+    def _init_histories(self, user_msg: str) -> tuple[ChatHistory, ChatHistory]:
+        generation_history = ChatHistory(
+            2, 2, self.history_token_budget, self.llm.model_name
+        )
+        generation_history.add(create_message(self.generation_system_prompt, "system"))
+        generation_history.add(create_message(user_msg, "user"))
+
+        reflection_history = ChatHistory(
+            1, 2, self.history_token_budget, self.llm.model_name
+        )
+        reflection_history.add(create_message(self.reflection_system_prompt, "system"))
+        return generation_history, reflection_history
+
+    def _add_response(
+        self,
+        generation_history: ChatHistory,
+        reflection_history: ChatHistory,
+        response: str,
+    ):
+        # Add the generated response to the history as assistant
+        generation_history.add(create_message(response, "assistant"))
+        # ...and to reflection_history as user
+        reflection_history.add(create_message(response, "user"))
+
+    def _add_critique(
+        self,
+        generation_history: ChatHistory,
+        reflection_history: ChatHistory,
+        critique: str,
+    ):
+        # Add the messages with reverse roles
+        generation_history.add(create_message(critique, "user"))
+        reflection_history.add(create_message(critique, "assistant"))
 
-        reflection_history = [create_message(self.reflection_system_prompt, "system")]
+    def generate(self, user_msg: str, max_steps: int = 10) -> str:
+        # Session-local LLM, so escalating does not affect other sessions of this agent
+        llm = self.llm
+        generation_history, reflection_history = self._init_histories(user_msg)
 
         response = ""
         for i in range(max_steps):
             # Generate a response
-            response = self.llm.generate(generation_history)
-            # Add the generated response to the history as assistant
-            add_message_to_history(
-                generation_history, create_message(response, "assistant"), 2, 2
-            )
-            # ...and to reflection_history as user
-            add_message_to_history(
-                reflection_history, create_message(response, "user"), 1, 2
-            )
+            response = llm.generate(generation_history.to_messages())
+            self._add_response(generation_history, reflection_history, response)
+            # Critique the generated response
+            critique = llm.generate(reflection_history.to_messages())
+            # Check if critique was positive
+            if DONE_SEQUENCE in critique:
+                logging.info(f"{DONE_SEQUENCE} found, stopping reflection agent!")
+                break
+            self._add_critique(generation_history, reflection_history, critique)
+            if i + 1 == self.escalate_after_steps:
+                llm = escalate(llm, f"critique not approved after {i + 1} steps")
+
+        return response
+
+    async def agenerate(self, user_msg: str, max_steps: int = 10) -> str:
+        # Session-local LLM, so escalating does not affect other sessions of this agent
+        llm = self.llm
+        generation_history, reflection_history = self._init_histories(user_msg)
+
+        response = ""
+        for i in range(max_steps):
+            # Generate a response without blocking the event loop
+            response = await llm.agenerate(generation_history.to_messages())
+            self._add_response(generation_history, reflection_history, response)
             # Critique the generated response
-            critique = self.llm.generate(reflection_history)
+            critique = await llm.agenerate(reflection_history.to_messages())
             # Check if critique was positive
             if DONE_SEQUENCE in critique:
                 logging.info(f"{DONE_SEQUENCE} found, stopping reflection agent!")
                 break
-            # Add the messages with reverse roles
-            add_message_to_history(
-                generation_history, create_message(critique, "user"), 2, 2
-            )
-            add_message_to_history(
-                reflection_history, create_message(critique, "assistant"), 1, 2
-            )
+            self._add_critique(generation_history, reflection_history, critique)
+            if i + 1 == self.escalate_after_steps:
+                llm = escalate(llm, f"critique not approved after {i + 1} steps")
 
         return response
@@ -0,0 +1,251 @@
+import json
+import logging
+import re
+import timeit
+
+from reason_and_act.json_repair import SANITIZE_ERROR_NAME, parse_tool_calls
+
+CORPUS_PATH = "malformed_tool_calls.jsonl"
+NUMBER = 200
+
+
+def legacy_sanitize_json_string(json_str: str) -> str:
+    # Copy of the previous regex cascade in reason_and_act/utils.py
+    # Skip sanitization if the string is already valid JSON
+    try:
+        json.loads(json_str)
+        return json_str
+    except json.JSONDecodeError:
+        pass
+
+    # Make a copy of the original for logging
+    original = json_str
+
+    try:
+        # Step 1: Try to identify and fix the most common JSON structure issues
+
+        # Replace triple backslashes with single backslashes
+        json_str = re.sub(r"\\\\\\", r"\\", json_str)
+
+        # Replace double backslashes with single backslashes
+        json_str = re.sub(r"\\\\", r"\\", json_str)
+
+        # Remove trailing commas in objects and arrays
+        json_str = re.sub(r",\s*}", "}", json_str)
+        json_str = re.sub(r",\s*]", "]", json_str)
+
+        # Ensure property names are properly quoted
+        json_str = re.sub(r"([{,]\s*)([a-zA-Z0-9_]+)(\s*:)", r'\1"\2"\3', json_str)
+
+        # Step 2: Advanced string content handling
+
+        # Parse the JSON structure to identify string values
+        # This is a more robust approach than simple character-by-character scanning
+
+        # First, try to identify the overall structure using regex
+        # Look for patterns like "key": "value" or "key": {...}
+        string_pattern = r'"([^"\\]*(\\.[^"\\]*)*)":\s*"([^"\\]*(\\.[^"\\]*)*)"'
+
+        # Find all string values and process them
+        def escape_string_content(match):
+            key = match.group(1)
+            value = match.group(3)
+
+            # Escape single quotes in the value
+            value = value.replace("'", "\\'")
+
+            # Escape unescaped double quotes in the value
+            value = re.sub(r'(?<!\\)"', '\\"', value)
+
+            return f'"{key}": "{value}"'
+
+        # Apply the string content escaping
+        json_str = re.sub(string_pattern, escape_string_content, json_str)
+
+        # Step 3: Handle nested content tags and special XML-like structures
+        # This is specifically for the case in the error example with <content>...</content> tags
+
+        # Find content between XML-like tags and escape it properly
+        tag_pattern = r"(<[a-zA-Z]+>)(.*?)(</[a-zA-Z]+>)"
+
+        def escape_tag_content(match):
+            opening_tag = match.group(1)
+            content = match.group(2)
+            closing_tag = match.group(3)
+
+            # Escape quotes and backslashes in the content
+            content = content.replace("\\", "\\\\")
+            content = content.replace('"', '\\"')
+            content = content.replace("'", "\\'")
+
+            return f"{opening_tag}{content}{closing_tag}"
+
+        json_str = re.sub(tag_pattern, escape_tag_content, json_str, flags=re.DOTALL)
+
+        # Step 4: Character-by-character processing for any remaining issues
+        # This is a fallback for complex cases that the regex patterns might miss
+
+        # Process the string character by character to handle nested quotes
+        in_string = False
+        escaped = False
+        chars = list(json_str)
+
+        for i in range(len(chars)):
+            if chars[i] == "\\":
+                escaped = not escaped
+            elif chars[i] == '"' and not escaped:
+                in_string = not in_string
+            elif chars[i] == "'" and in_string and not escaped:
+                # Replace unescaped single quotes with escaped single quotes inside JSON strings
+                chars[i] = "\\'"
+            elif chars[i] == '"' and in_string and not escaped:
+                # This is an unescaped double quote inside a string
+                chars[i - 1] = chars[i - 1] + "\\"
+            else:
+                escaped = False
+
+        json_str = "".join(chars)
+
+        # Try to parse the sanitized JSON
+        try:
+            json.loads(json_str)
+            if json_str != original:
+                logging.debug("JSON sanitized successfully")
+            return json_str
+        except json.JSONDecodeError as e:
+            # If standard sanitization fails, try a more aggressive approach
+            logging.warning(
+                f"Standard sanitization failed: {e}. Trying aggressive sanitization."
+            )
+
+            # Last resort: Try to extract and rebuild the JSON structure
+            try:
+                # Extract the basic structure: function name and arguments
+                name_match = re.search(r'"name"\s*:\s*"([^"]+)"', json_str)
+
+                if name_match:
+                    func_name = name_match.group(1)
+
+                    # Extract the arguments section
+                    args_match = re.search(r'"arguments"\s*:\s*({.+})', json_str)
+                    if args_match:
+                        args_str = args_match.group(1)
+
+                        # Extract key-value pairs from arguments
+                        key_value_pairs = {}
+                        kv_pattern = r'"([^"]+)"\s*:\s*"([^"]*(?:\\.[^"]*)*)"'
+                        for kv_match in re.finditer(kv_pattern, args_str):
+                            key = kv_match.group(1)
+                            value = kv_match.group(2)
+                            # Clean the value
+                            value = value.replace("'", "\\'")
+                            key_value_pairs[key] = value
+
+                        # Rebuild the JSON
+                        args_json = json.dumps(key_value_pairs)
+                        rebuilt_json = (
+                            f'{{"name": "{func_name}", "arguments": {args_json}}}'
+                        )
+
+                        # Verify it's valid JSON
+                        json.loads(rebuilt_json)
+                        logging.info("Successfully rebuilt JSON structure")
+                        return rebuilt_json
+            except Exception as rebuild_error:
+                logging.warning(f"Failed to rebuild JSON: {rebuild_error}")
+
+            # If all else fails, return a simplified valid JSON with error info
+            error_json = json.dumps(
+                {
+                    "name": SANITIZE_ERROR_NAME,
+                    "arguments": {
+                        "error": f"Failed to parse JSON: {str(e)}",
+                        "original": (
+                            original[:100] + "..." if len(original) > 100 else original
+                        ),
+                    },
+                }
+            )
+            return error_json
+
+    except Exception as e:
+        # Catch any unexpected errors in the sanitization process
+        logging.error(f"Unexpected error in JSON sanitization: {e}")
+
+        # Create a valid JSON with error information
+        error_json = json.dumps(
+            {
+                "name": SANITIZE_ERROR_NAME,
+                "arguments": {
+                    "error": f"Sanitization error: {str(e)}",
+                    "original": (
+                        original[:100] + "..." if len(original) > 100 else original
+                    ),
+                },
+            }
+        )
+
+        return error_json
+
+
+def legacy_parse_tool_calls(text: str) -> list[dict]:
+    # Previous ReactAgent parsing of a single call
+    try:
+        return [json.loads(legacy_sanitize_json_string(text))]
+    except Exception as e:
+        return [{"name": SANITIZE_ERROR_NAME, "arguments": {"error": str(e)}}]
+
+
+def is_expected(calls: list[dict], expected) -> bool:
+    expected = expected if isinstance(expected, list) else [expected]
+    if expected[0]["name"] == SANITIZE_ERROR_NAME:
+        return calls[0].get("name") == SANITIZE_ERROR_NAME
+    return calls == expected
+
+
+def run_benchmark():
+    # The legacy function logs every failed attempt
+    logging.disable(logging.WARNING)
+    with open(CORPUS_PATH) as f:
+        corpus = [json.loads(line) for line in f]
+    # A large tool call, like a moderated post submitted by the multi agent example
+    large = next(case for case in corpus if case["case"] == "embedded xml")
+    padding = 'The Sun "moves" around us. ' * 2000
+    large_text = large["text"].replace("<content>", "<content>" + padding)
+    large_expected = json.loads(
+        json.dumps(large["expected"]).replace(
+            "<content>", "<content>" + json.dumps(padding)[1:-1]
+        )
+    )
+    corpus.append(
+        {
+            "case": f"embedded xml, {len(large_text) // 1024} KB",
+            "text": large_text,
+            "expected": large_expected,
+        }
+    )
+    totals = {"legacy": 0.0, "single pass": 0.0}
+    recovered = {"legacy": 0, "single pass": 0}
+    print(f"{'case':<32} {'legacy us':>10} {'single pass us':>15}  recovered")
+    for case in corpus:
+        row = []
+        for label, parse in (
+            ("legacy", legacy_parse_tool_calls),
+            ("single pass", parse_tool_calls),
+        ):
+            seconds = timeit.timeit(lambda: parse(case["text"]), number=NUMBER) / NUMBER
+            totals[label] += seconds
+            ok = is_expected(parse(case["text"]), case["expected"])
+            recovered[label] += ok
+            row.append((seconds, ok))
+        print(
+            f"{case['case']:<32} {row[0][0] * 1e6:10.1f} {row[1][0] * 1e6:15.1f}  {'yes' if row[0][1] else 'no':>3} / {'yes' if row[1][1] else 'no'}"
+        )
+    for label in totals:
+        print(
+            f"{label}: {totals[label] * 1e6:.1f} us for the corpus, {recovered[label]}/{len(corpus)} as expected"
+        )
+
+
+if __name__ == "__main__":
+    run_benchmark()
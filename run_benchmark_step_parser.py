@@ -0,0 +1,85 @@
+import re
+import timeit
+
+from reason_and_act.step_parser import (
+    STEP_ANSWER,
+    STEP_CALL,
+    STEP_THOUGHT,
+    StepParser,
+    parse_steps,
+    step_contents,
+)
+from reason_and_act.utils import (
+    THOUGHT_TAG,
+    THOUGHT_TAG_END,
+    RESPONSE_TAG,
+    RESPONSE_TAG_END,
+)
+from tool_use.utils import TOOLS_INVOCATIONS_TAG, TOOLS_INVOCATIONS_TAG_END
+
+RESPONSES = {
+    "thought and calls": f"""{THOUGHT_TAG}I need the close prices of NVDA and PLTR on both dates{THOUGHT_TAG_END}
+{TOOLS_INVOCATIONS_TAG}{{"name": "get_spot_price_func", "arguments": {{"ticker_symbol": "NVDA", "date": "2025-05-07"}}}}{TOOLS_INVOCATIONS_TAG_END}
+{TOOLS_INVOCATIONS_TAG}{{"name": "get_spot_price_func", "arguments": {{"ticker_symbol": "PLTR", "date": "2025-05-07"}}}}{TOOLS_INVOCATIONS_TAG_END}
+{TOOLS_INVOCATIONS_TAG}{{"name": "get_spot_price_func", "arguments": {{"ticker_symbol": "NVDA", "date": "2025-05-14"}}}}{TOOLS_INVOCATIONS_TAG_END}
+{TOOLS_INVOCATIONS_TAG}{{"name": "get_spot_price_func", "arguments": {{"ticker_symbol": "PLTR", "date": "2025-05-14"}}}}{TOOLS_INVOCATIONS_TAG_END}""",
+    "answer": f"""{THOUGHT_TAG}I have all the prices and growth rates{THOUGHT_TAG_END}
+{RESPONSE_TAG}The price growth rate was higher for PLTR (0.1213) than for NVDA (0.0712).{RESPONSE_TAG_END}""",
+    "long thought": f"{THOUGHT_TAG}{'Reasoning about the query. ' * 200}{THOUGHT_TAG_END}",
+}
+NUMBER = 20000
+
+
+def extract_response_content(text: str, tag: str, tag_end: str) -> list:
+    # Previous ReactAgent implementation, one regex scan per tag
+    tag_pattern = rf"{tag}(.*?){tag_end}"
+    matched_contents = re.findall(tag_pattern, text, re.DOTALL)
+    return [content.strip() for content in matched_contents]
+
+
+def legacy_parse(text: str) -> tuple:
+    return (
+        extract_response_content(
+            text, TOOLS_INVOCATIONS_TAG, TOOLS_INVOCATIONS_TAG_END
+        ),
+        extract_response_content(text, RESPONSE_TAG, RESPONSE_TAG_END),
+        extract_response_content(text, THOUGHT_TAG, THOUGHT_TAG_END),
+    )
+
+
+def single_pass_parse(text: str) -> tuple:
+    steps = parse_steps(text)
+    return (
+        step_contents(steps, STEP_CALL),
+        step_contents(steps, STEP_ANSWER),
+        step_contents(steps, STEP_THOUGHT),
+    )
+
+
+def streamed_parse(text: str, chunk_size: int = 8) -> list:
+    parser = StepParser()
+    for i in range(0, len(text), chunk_size):
+        parser.feed(text[i : i + chunk_size])
+    parser.finish()
+    return parser.steps
+
+
+def run_benchmark():
+    for name, response in RESPONSES.items():
+        # Both parsers must agree before their cost is compared
+        assert legacy_parse(response) == single_pass_parse(response)
+        steps = len(parse_steps(response))
+        print(f"{name} ({len(response)} chars, {steps} steps)")
+        for label, parse in (
+            ("three regex scans", legacy_parse),
+            ("single pass", single_pass_parse),
+            ("streamed, 8 char chunks", streamed_parse),
+        ):
+            seconds = timeit.timeit(lambda: parse(response), number=NUMBER)
+            print(
+                f"  {label:<24} {seconds / NUMBER * 1e6:8.2f} us per response, {seconds / NUMBER / steps * 1e6:8.2f} us per step"
+            )
+
+
+if __name__ == "__main__":
+    run_benchmark()
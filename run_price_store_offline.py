@@ -0,0 +1,65 @@
+import shutil
+import tempfile
+from datetime import date
+
+from market_data.price_store import PriceStore
+from market_data.spot_prices import get_spot_price_batch
+
+FIXTURE_PATH = "price_fixture_nvda.csv"
+
+
+def fail_fetch(tickers: list[str], start: date, end: date) -> dict:
+    raise AssertionError(f"Unexpected download of {tickers} from {start} to {end}")
+
+
+def empty_fetch(tickers: list[str], start: date, end: date) -> dict:
+    # Failed or rate-limited yfinance downloads come back empty instead of raising
+    return {}
+
+
+def run_offline_check():
+    # Builds the store from daily bars exported by yfinance, without any network access
+    path = tempfile.mkdtemp()
+    try:
+        store = PriceStore(path, fail_fetch)
+        store.load_csv("NVDA", FIXTURE_PATH)
+        assert store.get_close("NVDA", date(2025, 5, 7)) == 117.06
+        # Weekends inside the loaded range are known non-trading days
+        try:
+            store.get_close("NVDA", date(2025, 5, 10))
+            raise AssertionError("2025-05-10 is a Saturday")
+        except ValueError:
+            pass
+        # A malformed call fails only its own result, the others share one lookup
+        results = get_spot_price_batch(
+            [
+                {"ticker_symbol": "NVDA", "date": "2025-05-12"},
+                {"ticker_symbol": "NVDA", "date": "last wednesday-ish"},
+                {"ticker_symbol": "NVDA"},
+                {"ticker_symbol": "nvda", "date": "2025-05-14"},
+            ],
+            store=store,
+        )
+        assert results[0] == 123.0 and results[3] == 135.34
+        assert isinstance(results[1], Exception) and isinstance(results[2], KeyError)
+        # The memory-mapped files are shared by every store opened on the same path
+        assert (
+            PriceStore(path, fail_fetch).get_close("NVDA", date(2025, 5, 5)) == 113.82
+        )
+        # An empty download does not mark its range as known, so the next store fetches it again
+        empty_store = PriceStore(path, empty_fetch)
+        try:
+            empty_store.get_close("NVDA", date(2025, 5, 2))
+            raise AssertionError("No close was loaded for 2025-05-02")
+        except ValueError:
+            pass
+        retry_store = PriceStore(path, empty_fetch)
+        retry_store.get_closes([("NVDA", date(2025, 5, 2))])
+        assert empty_store.fetches == 1 and retry_store.fetches == 1
+        print("Price store offline check passed")
+    finally:
+        shutil.rmtree(path)
+
+
+if __name__ == "__main__":
+    run_offline_check()
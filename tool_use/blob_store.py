@@ -0,0 +1,63 @@
+import threading
+from collections import OrderedDict
+
+import xxhash
+
+from tool_use.llm_tool import convert_to_llm_tool
+from tool_use.process_pool import EXECUTION_INLINE
+
+# Characters of a blob returned per read_blob call
+BLOB_PAGE_CHARS = 4000
+MAX_BLOBS = 256
+
+
+class BlobStore:
+    def __init__(self, page_chars: int = BLOB_PAGE_CHARS, max_blobs: int = MAX_BLOBS):
+        self.page_chars = page_chars
+        self.max_blobs = max_blobs
+        # Bounded LRU of full tool outputs kept out of the prompt: handle -> text
+        self._blobs: OrderedDict[str, str] = OrderedDict()
+        self._lock = threading.Lock()
+        # Built-in tool the model pages through a blob with, cheap enough to run inline
+        self.read_tool = convert_to_llm_tool(self.read_blob, execution=EXECUTION_INLINE)
+
+    def put(self, text: str) -> str:
+        # Content addressed, so the same output stored twice shares one handle
+        handle = f"blob-{xxhash.xxh3_64_hexdigest(text.encode())}"
+        with self._lock:
+            self._blobs[handle] = text
+            self._blobs.move_to_end(handle)
+            if len(self._blobs) > self.max_blobs:
+                self._blobs.popitem(last=False)
+        return handle
+
+    def get(self, handle: str) -> str | None:
+        with self._lock:
+            return self._blobs.get(handle)
+
+    def page_count(self, text: str) -> int:
+        return max(1, -(-len(text) // self.page_chars))
+
+    def read_blob(self, handle: str, page: int = 1) -> str:
+        """
+        Read one page of a large function result that was stored out of the observation.
+
+        Parameters:
+        handle (str): the blob handle given in the observation, like blob-1a2b3c4d5e6f7a8b
+        page (int): the page to read, starting at 1
+
+        Returns:
+        str: The requested page of the function result
+        """
+        text = self.get(handle.strip())
+        if text is None:
+            raise Exception(
+                f"Blob {handle} does not exist. Use a handle given in an observation."
+            )
+        pages = self.page_count(text)
+        if not 1 <= page <= pages:
+            raise Exception(f"Blob {handle} has pages 1 to {pages}, not {page}.")
+        start = (page - 1) * self.page_chars
+        return (
+            f"{handle} page {page} of {pages}:\n{text[start : start + self.page_chars]}"
+        )
@@ -1,18 +1,238 @@
+import asyncio
+import inspect
 import json
+import threading
+from types import MappingProxyType
 from typing import Callable
 
+import xxhash
+
+from model.tiered_cache import TieredCache, MISSING
+from model.utils import get_type_coercer
+from tool_use.process_pool import (
+    EXECUTION_INLINE,
+    EXECUTION_POLICIES,
+    EXECUTION_PROCESS,
+    EXECUTION_THREAD,
+    get_tool_process_pool,
+)
+from tool_use.utils import JSON_SCHEMA_TYPES, get_tool_executor
+
 
 class LLMTool:
-    def __init__(self, name: str, description: str, function: Callable):
+    def __init__(
+        self,
+        name: str,
+        description: str,
+        function: Callable,
+        timeout: float | None = None,
+        cache: TieredCache | None = None,
+        required: list[str] | None = None,
+        batch_function: Callable | None = None,
+        execution: str = EXECUTION_THREAD,
+        max_output_tokens: int | None = None,
+    ):
+        if execution not in EXECUTION_POLICIES:
+            raise ValueError(
+                f"Unknown execution policy {execution}, use one of {EXECUTION_POLICIES}"
+            )
         self.name = name
         self.description = description
         self.function = function
+        # Parse the signature once, so dispatching a call is only lookups and direct calls
+        signature = json.loads(description)
+        self.parameters = MappingProxyType(dict(signature.get("parameters", {})))
+        self.coercers = MappingProxyType(
+            {
+                param_name: get_type_coercer(param_type)
+                for param_name, param_type in self.parameters.items()
+            }
+        )
+        # OpenAI tools entry for native function calling, parameters without defaults are required
+        self.json_schema = self._build_json_schema(
+            signature.get("description"),
+            list(self.parameters) if required is None else required,
+        )
+        # Coroutine tools are awaited natively, blocking ones run in the tool executor
+        self.is_async = inspect.iscoroutinefunction(function)
+        # Optional bulk implementation taking a list of argument dicts and returning one result per dict,
+        # a result may be an exception instance to fail only that call
+        self.batch_function = batch_function
+        self.is_async_batch = inspect.iscoroutinefunction(batch_function)
+        # Seconds an agent waits for the result before reporting a timeout
+        self.timeout = timeout
+        # Optional result cache, only for tools whose result depends on the arguments alone
+        self.cache = cache
+        # inline: cheap tools run in the dispatching thread, thread: blocking tools run in the tool executor,
+        # process: CPU-heavy or untrusted tools run in the warm process pool and are killed on timeout
+        self.execution = execution
+        # Tokens of the result an agent pastes into the prompt, overriding the agent's observation budget
+        self.max_output_tokens = max_output_tokens
+
+    def _build_json_schema(self, description: str | None, required: list[str]) -> dict:
+        properties = {
+            param_name: dict(JSON_SCHEMA_TYPES.get(param_type, {}))
+            for param_name, param_type in self.parameters.items()
+        }
+        return {
+            "type": "function",
+            "function": {
+                "name": self.name,
+                "description": (description or "").strip(),
+                "parameters": {
+                    "type": "object",
+                    "properties": properties,
+                    "required": required,
+                    "additionalProperties": False,
+                },
+                # Strict mode requires every parameter to be required
+                "strict": len(required) == len(properties),
+            },
+        }
+
+    def coerce_arguments(self, arguments: dict) -> dict:
+        coerced = {}
+        for arg_name, arg_value in arguments.items():
+            coercer = self.coercers.get(arg_name)
+            if coercer is None:
+                raise Exception(
+                    f"Function {self.name} does not have argument {arg_name}. Call it with those arguments: {list(self.parameters.keys())}"
+                )
+            # Convert the argument value to the correct type if needed
+            coerced[arg_name] = coercer(arg_value)
+        return coerced
+
+    def _cache_key(self, kwargs: dict) -> str:
+        # Arguments are already coerced by the agent, so equal calls serialize equally
+        payload = json.dumps(
+            [self.name, kwargs], sort_keys=True, separators=(",", ":"), default=str
+        )
+        return xxhash.xxh3_128_hexdigest(payload.encode())
+
+    def _run(self, function: Callable, is_async: bool, args: tuple, kwargs: dict):
+        if self.execution == EXECUTION_PROCESS:
+            # The function and its arguments must be picklable, module level functions are
+            return get_tool_process_pool().run(function, args, kwargs, self.timeout)
+        if is_async:
+            # Blocking callers (worker threads) have no running event loop, so start one
+            return asyncio.run(function(*args, **kwargs))
+        return function(*args, **kwargs)
+
+    def _call(self, kwargs: dict):
+        return self._run(self.function, self.is_async, (), kwargs)
 
     def invoke(self, **kwargs):
-        return self.function(**kwargs)
+        if self.cache is None:
+            return self._call(kwargs)
+        key = self._cache_key(kwargs)
+        result = self.cache.get(key)
+        if result is MISSING:
+            result = self._call(kwargs)
+            self.cache.set(key, result)
+        return result
+
+    async def _arun(
+        self, function: Callable, is_async: bool, args: tuple, kwargs: dict
+    ):
+        loop = asyncio.get_running_loop()
+        if self.execution == EXECUTION_PROCESS:
+            cancel = threading.Event()
+            try:
+                return await loop.run_in_executor(
+                    get_tool_executor(),
+                    lambda: get_tool_process_pool().run(
+                        function, args, kwargs, self.timeout, cancel
+                    ),
+                )
+            except asyncio.CancelledError:
+                # Kill the worker process instead of leaving the call running
+                cancel.set()
+                raise
+        if is_async:
+            return await function(*args, **kwargs)
+        if self.execution == EXECUTION_INLINE:
+            return function(*args, **kwargs)
+        return await loop.run_in_executor(
+            get_tool_executor(), lambda: function(*args, **kwargs)
+        )
+
+    async def _acall(self, kwargs: dict):
+        return await self._arun(self.function, self.is_async, (), kwargs)
+
+    async def ainvoke(self, **kwargs):
+        if self.cache is None:
+            return await self._acall(kwargs)
+        key = self._cache_key(kwargs)
+        result = self.cache.get(key)
+        if result is MISSING:
+            result = await self._acall(kwargs)
+            self.cache.set(key, result)
+        return result
+
+    def _check_batch_results(self, arguments_list: list[dict], results) -> list:
+        results = list(results)
+        if len(results) != len(arguments_list):
+            raise Exception(
+                f"Function {self.name} returned {len(results)} results for {len(arguments_list)} calls."
+            )
+        return results
+
+    def _call_batch(self, arguments_list: list[dict]) -> list:
+        results = self._run(
+            self.batch_function, self.is_async_batch, (arguments_list,), {}
+        )
+        return self._check_batch_results(arguments_list, results)
+
+    def _cached_results(self, arguments_list: list[dict]) -> tuple[list, list]:
+        if self.cache is None:
+            return [MISSING] * len(arguments_list), []
+        keys = [self._cache_key(kwargs) for kwargs in arguments_list]
+        return [self.cache.get(key) for key in keys], keys
+
+    def _store_results(
+        self, keys: list, pending: list[int], results: list, batch_results: list
+    ):
+        for i, result in zip(pending, batch_results):
+            results[i] = result
+            # Failed calls are not cached, they are retried with the next batch
+            if keys and not isinstance(result, Exception):
+                self.cache.set(keys[i], result)
+
+    def invoke_batch(self, arguments_list: list[dict]) -> list:
+        # Results in argument order, cached calls are left out of the backend request
+        results, keys = self._cached_results(arguments_list)
+        pending = [i for i, result in enumerate(results) if result is MISSING]
+        if pending:
+            batch_results = self._call_batch([arguments_list[i] for i in pending])
+            self._store_results(keys, pending, results, batch_results)
+        return results
+
+    async def _acall_batch(self, arguments_list: list[dict]) -> list:
+        results = await self._arun(
+            self.batch_function, self.is_async_batch, (arguments_list,), {}
+        )
+        return self._check_batch_results(arguments_list, results)
+
+    async def ainvoke_batch(self, arguments_list: list[dict]) -> list:
+        # Results in argument order, cached calls are left out of the backend request
+        results, keys = self._cached_results(arguments_list)
+        pending = [i for i, result in enumerate(results) if result is MISSING]
+        if pending:
+            batch_results = await self._acall_batch(
+                [arguments_list[i] for i in pending]
+            )
+            self._store_results(keys, pending, results, batch_results)
+        return results
 
 
-def convert_to_llm_tool(function: Callable):
+def convert_to_llm_tool(
+    function: Callable,
+    timeout: float | None = None,
+    cache: TieredCache | None = None,
+    batch_function: Callable | None = None,
+    execution: str = EXECUTION_THREAD,
+    max_output_tokens: int | None = None,
+):
     # Get the schema of the function
     function_schema = {
         name: typ.__name__
@@ -25,10 +245,22 @@ def convert_to_llm_tool(function: Callable):
         "description": function.__doc__,
         "parameters": function_schema,
     }
+    # Parameters with default values are optional in native function calling
+    required = [
+        name
+        for name, param in inspect.signature(function).parameters.items()
+        if name in function_schema and param.default is inspect.Parameter.empty
+    ]
     # return a LLMTool instance
     ret = LLMTool(
         name=function_signature.get("name"),
         description=json.dumps(function_signature),
         function=function,
+        timeout=timeout,
+        cache=cache,
+        required=required,
+        batch_function=batch_function,
+        execution=execution,
+        max_output_tokens=max_output_tokens,
     )
     return ret
@@ -0,0 +1,144 @@
+import json
+import logging
+import threading
+
+from model.base_llm import BaseLLM
+from model.tokens import get_encoding
+from model.utils import create_message
+from tool_use.blob_store import BlobStore
+from tool_use.llm_tool import LLMTool
+
+# Tokens of one function result pasted into an observation, unless its tool sets its own budget
+DEFAULT_OBSERVATION_TOKENS = 1024
+# Share of a truncated result kept from its start, the rest comes from its end
+OBSERVATION_HEAD_RATIO = 0.7
+# Tokens of an oversized result the summarizer reads at most
+MAX_SUMMARY_INPUT_TOKENS = 16384
+
+
+class ObservationFormatter:
+    def __init__(
+        self,
+        max_tokens: int = DEFAULT_OBSERVATION_TOKENS,
+        head_ratio: float = OBSERVATION_HEAD_RATIO,
+        summarizer: BaseLLM | None = None,
+        blob_store: BlobStore | None = None,
+        model_name: str = "",
+    ):
+        self.max_tokens = max_tokens
+        self.head_ratio = head_ratio
+        # Optional cheap model condensing oversized results instead of cutting out their middle
+        self.summarizer = summarizer
+        # Optional store keeping the full oversized results behind a handle the model can page through
+        self.blob_store = blob_store
+        self.model_name = model_name
+        self.truncated = 0
+        self.summarized = 0
+        self._lock = threading.Lock()
+        self.summarizer_prompt = """You condense the output of a function call for another AI model that called it.
+Keep the structure: field names, column names, identifiers, dates, numbers and error messages relevant to the call, drop repetition and boilerplate.
+Answer with the condensed output only, as compact key: value lines or a short table."""
+
+    def _budget(self, tool: LLMTool) -> int:
+        return (
+            tool.max_output_tokens
+            if tool.max_output_tokens is not None
+            else self.max_tokens
+        )
+
+    def _oversized_tokens(self, text: str, budget: int) -> list[int] | None:
+        # Tokens are at least one character long, so short results skip the tokenizer
+        if len(text) <= budget:
+            return None
+        tokens = get_encoding(self.model_name).encode(text, disallowed_special=())
+        return tokens if len(tokens) > budget else None
+
+    def _truncate(self, tokens: list[int], budget: int) -> str:
+        encoding = get_encoding(self.model_name)
+        head = int(budget * self.head_ratio)
+        tail = (
+            encoding.decode(tokens[len(tokens) - (budget - head) :])
+            if budget > head
+            else ""
+        )
+        return f"{encoding.decode(tokens[:head])}\n[... {len(tokens) - budget} tokens omitted ...]\n{tail}"
+
+    def _summary_messages(
+        self, tool: LLMTool, arguments: dict, tokens: list[int], budget: int
+    ) -> list[dict]:
+        output = (
+            self._truncate(tokens, MAX_SUMMARY_INPUT_TOKENS)
+            if len(tokens) > MAX_SUMMARY_INPUT_TOKENS
+            else get_encoding(self.model_name).decode(tokens)
+        )
+        call = json.dumps({"name": tool.name, "arguments": arguments}, default=str)
+        return [
+            create_message(self.summarizer_prompt, "system"),
+            create_message(
+                f"Function call: {call}\nCondense this output to at most {budget} tokens:\n{output}",
+                "user",
+            ),
+        ]
+
+    def _fit(self, text: str, budget: int) -> str:
+        # Summaries that still exceed the budget are cut as well
+        tokens = self._oversized_tokens(text, budget)
+        return text if tokens is None else self._truncate(tokens, budget)
+
+    def _shorten(
+        self, text: str, tokens: list[int], budget: int, summary: str | None
+    ) -> str:
+        with self._lock:
+            if summary is None:
+                self.truncated += 1
+            else:
+                self.summarized += 1
+        shortened = (
+            self._truncate(tokens, budget)
+            if summary is None
+            else self._fit(summary, budget)
+        )
+        if self.blob_store is None:
+            return shortened
+        handle = self.blob_store.put(text)
+        return f"{shortened}\n[The full result is stored as {handle} with {self.blob_store.page_count(text)} pages, read it with read_blob if you need more]"
+
+    def _is_builtin(self, tool: LLMTool) -> bool:
+        # Pages of a blob already fit the budget and must not be stored again
+        return self.blob_store is not None and tool is self.blob_store.read_tool
+
+    def format(self, tool: LLMTool, arguments: dict, result) -> str:
+        text = str(result)
+        budget = self._budget(tool)
+        tokens = (
+            None if self._is_builtin(tool) else self._oversized_tokens(text, budget)
+        )
+        if tokens is None:
+            return text
+        summary = None
+        if self.summarizer is not None:
+            try:
+                summary = self.summarizer.generate(
+                    self._summary_messages(tool, arguments, tokens, budget)
+                )
+            except Exception as e:
+                logging.warning(f"Summarizing the result of {tool.name} failed: {e}")
+        return self._shorten(text, tokens, budget, summary)
+
+    async def aformat(self, tool: LLMTool, arguments: dict, result) -> str:
+        text = str(result)
+        budget = self._budget(tool)
+        tokens = (
+            None if self._is_builtin(tool) else self._oversized_tokens(text, budget)
+        )
+        if tokens is None:
+            return text
+        summary = None
+        if self.summarizer is not None:
+            try:
+                summary = await self.summarizer.agenerate(
+                    self._summary_messages(tool, arguments, tokens, budget)
+                )
+            except Exception as e:
+                logging.warning(f"Summarizing the result of {tool.name} failed: {e}")
+        return self._shorten(text, tokens, budget, summary)
@@ -0,0 +1,200 @@
+import asyncio
+import atexit
+import inspect
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from concurrent.futures import CancelledError
+from typing import Callable
+
+# Execution policies of LLMTool
+EXECUTION_INLINE = "inline"
+EXECUTION_THREAD = "thread"
+EXECUTION_PROCESS = "process"
+EXECUTION_POLICIES = (EXECUTION_INLINE, EXECUTION_THREAD, EXECUTION_PROCESS)
+
+# Shared warm pool for process tools, workers are replaced after this many calls or this much memory
+MAX_TOOL_PROCESSES = min(os.cpu_count() or 1, 8)
+TOOL_WORKER_MAX_CALLS = 200
+TOOL_WORKER_MAX_RSS_BYTES = 1024**3
+# Seconds between checks for cancellation while a call runs
+POLL_INTERVAL = 0.05
+
+
+def _rss_bytes() -> int:
+    # Current resident memory of this process, 0 where it cannot be read
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return 0
+
+
+def _worker_main(conn):
+    # Runs calls until the pool sends None or closes the pipe
+    while True:
+        try:
+            task = conn.recv()
+        except EOFError:
+            break
+        if task is None:
+            break
+        function, args, kwargs = task
+        try:
+            if inspect.iscoroutinefunction(function):
+                result = asyncio.run(function(*args, **kwargs))
+            else:
+                result = function(*args, **kwargs)
+            response = (True, result)
+        except Exception as e:
+            response = (False, e)
+        try:
+            conn.send((*response, _rss_bytes()))
+        except Exception as e:
+            # Unpicklable result or exception, report it as text
+            conn.send((False, Exception(f"{type(e).__name__}: {e}"), _rss_bytes()))
+
+
+class _Worker:
+    def __init__(self, context):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(
+            target=_worker_main, args=(child_conn,), daemon=True
+        )
+        self.process.start()
+        child_conn.close()
+        self.calls = 0
+
+    def stop(self, kill: bool = False):
+        if kill:
+            self.process.kill()
+        else:
+            try:
+                self.conn.send(None)
+            except OSError:
+                self.process.kill()
+        self.process.join(timeout=1)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.conn.close()
+
+
+class ToolProcessPool:
+    def __init__(
+        self,
+        size: int = MAX_TOOL_PROCESSES,
+        max_calls_per_worker: int | None = TOOL_WORKER_MAX_CALLS,
+        max_rss_bytes: int | None = TOOL_WORKER_MAX_RSS_BYTES,
+        start_method: str = "spawn",
+    ):
+        self.size = size
+        self.max_calls_per_worker = max_calls_per_worker
+        self.max_rss_bytes = max_rss_bytes
+        # Spawned workers do not inherit the locks and threads of the agent process
+        self._context = multiprocessing.get_context(start_method)
+        # Most recently used workers first, they are the warmest
+        self._idle: queue.LifoQueue = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._workers: set = set()
+        self._closed = False
+        self.recycled = 0
+        self.killed = 0
+        # Start every worker up front, so no call pays the interpreter start-up
+        for _ in range(size):
+            self._idle.put(self._start_worker())
+
+    def _start_worker(self) -> _Worker:
+        worker = _Worker(self._context)
+        with self._lock:
+            self._workers.add(worker)
+        return worker
+
+    def _retire(self, worker: _Worker, kill: bool):
+        with self._lock:
+            self._workers.discard(worker)
+        worker.stop(kill)
+        if self._closed:
+            return
+        # The replacement starts in the background and joins the idle workers once ready
+        threading.Thread(
+            target=lambda: self._idle.put(self._start_worker()), daemon=True
+        ).start()
+
+    def _release(self, worker: _Worker, rss: int):
+        worker.calls += 1
+        if (
+            self.max_calls_per_worker is not None
+            and worker.calls >= self.max_calls_per_worker
+        ) or (self.max_rss_bytes is not None and rss > self.max_rss_bytes):
+            self.recycled += 1
+            self._retire(worker, kill=False)
+        else:
+            self._idle.put(worker)
+
+    def run(
+        self,
+        function: Callable,
+        args: tuple = (),
+        kwargs: dict | None = None,
+        timeout: float | None = None,
+        cancel: threading.Event | None = None,
+    ):
+        # The timeout is wall-clock time, including the wait for an idle worker
+        deadline = None if timeout is None else time.monotonic() + timeout
+        try:
+            worker = self._idle.get(timeout=timeout)
+        except queue.Empty:
+            raise TimeoutError(
+                f"No tool worker process became available within {timeout} seconds."
+            )
+        try:
+            worker.conn.send((function, args, kwargs or {}))
+        except Exception:
+            # Nothing was sent, the worker is still usable
+            self._idle.put(worker)
+            raise
+        while not worker.conn.poll(POLL_INTERVAL):
+            if cancel is not None and cancel.is_set():
+                # A running call cannot be interrupted, so its worker is killed and replaced
+                self.killed += 1
+                self._retire(worker, kill=True)
+                raise CancelledError()
+            if deadline is not None and time.monotonic() >= deadline:
+                self.killed += 1
+                self._retire(worker, kill=True)
+                raise TimeoutError(f"Call did not finish within {timeout} seconds.")
+        try:
+            ok, result, rss = worker.conn.recv()
+        except (EOFError, OSError):
+            # The worker crashed or was killed by the system
+            self.killed += 1
+            self._retire(worker, kill=True)
+            raise Exception("The tool worker process exited during the call.")
+        self._release(worker, rss)
+        if not ok:
+            raise result
+        return result
+
+    def shutdown(self):
+        self._closed = True
+        with self._lock:
+            workers = list(self._workers)
+            self._workers.clear()
+        for worker in workers:
+            worker.stop()
+
+
+_process_pool: ToolProcessPool | None = None
+_process_pool_lock = threading.Lock()
+
+
+def get_tool_process_pool() -> ToolProcessPool:
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is None:
+            _process_pool = ToolProcessPool()
+            atexit.register(_process_pool.shutdown)
+        return _process_pool
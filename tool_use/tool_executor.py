@@ -0,0 +1,184 @@
+import asyncio
+import time
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+from tool_use.llm_tool import LLMTool
+from tool_use.process_pool import EXECUTION_INLINE, EXECUTION_PROCESS
+from tool_use.utils import get_tool_executor
+
+
+def _timeout_error(tool: LLMTool) -> TimeoutError:
+    return TimeoutError(
+        f"Function {tool.name} did not finish within {tool.timeout} seconds. Try again later or answer with the data you have."
+    )
+
+
+def _group_invocations(
+    invocations: list[tuple[LLMTool, dict]],
+) -> list[tuple[LLMTool, list[int]]]:
+    # Calls to the same batch-capable tool share one backend request, all others run on their own
+    groups = []
+    batch_groups = {}
+    for i, (tool, _) in enumerate(invocations):
+        if tool.batch_function is None:
+            groups.append((tool, [i]))
+        elif tool.name in batch_groups:
+            batch_groups[tool.name][1].append(i)
+        else:
+            batch_groups[tool.name] = (tool, [i])
+            groups.append(batch_groups[tool.name])
+    return groups
+
+
+def _invoke_group(tool: LLMTool, arguments_list: list[dict]) -> list:
+    if len(arguments_list) == 1:
+        return [tool.invoke(**arguments_list[0])]
+    return tool.invoke_batch(arguments_list)
+
+
+async def _ainvoke_group(tool: LLMTool, arguments_list: list[dict]) -> list:
+    if len(arguments_list) == 1:
+        return [await tool.ainvoke(**arguments_list[0])]
+    return await tool.ainvoke_batch(arguments_list)
+
+
+def _fan_out(groups: list, group_results: list, count: int) -> list:
+    # Spread the results of each group back to the positions of its calls
+    results = [None] * count
+    for (_, indices), result in zip(groups, group_results):
+        if isinstance(result, BaseException):
+            result = [result] * len(indices)
+        for i, item in zip(indices, result):
+            results[i] = item
+    return results
+
+
+def invoke_tools(invocations: list[tuple[LLMTool, dict]]) -> list:
+    # Returns the results in invocation order, with failed calls as their exceptions
+    groups = _group_invocations(invocations)
+    arguments = [[invocations[i][1] for i in indices] for _, indices in groups]
+    if len(groups) == 1 and (
+        groups[0][0].timeout is None or groups[0][0].execution == EXECUTION_PROCESS
+    ):
+        # Nothing to overlap, so skip the thread hand-off (process tools enforce their own timeout)
+        tool = groups[0][0]
+        try:
+            group_results = [_invoke_group(tool, arguments[0])]
+        except TimeoutError:
+            group_results = [_timeout_error(tool)]
+        except Exception as e:
+            group_results = [e]
+        return _fan_out(groups, group_results, len(invocations))
+    executor = get_tool_executor()
+    start = time.monotonic()
+    # Inline tools run in this thread once the others are submitted
+    futures = [
+        (
+            None
+            if tool.execution == EXECUTION_INLINE
+            else executor.submit(_invoke_group, tool, arguments_list)
+        )
+        for (tool, _), arguments_list in zip(groups, arguments)
+    ]
+    group_results = []
+    for (tool, _), arguments_list, future in zip(groups, arguments, futures):
+        if future is None:
+            try:
+                group_results.append(_invoke_group(tool, arguments_list))
+            except Exception as e:
+                group_results.append(e)
+            continue
+        timeout = (
+            None
+            if tool.timeout is None
+            else max(0.0, start + tool.timeout - time.monotonic())
+        )
+        try:
+            group_results.append(future.result(timeout=timeout))
+        except FutureTimeoutError:
+            # The worker thread cannot be killed, its late result is simply dropped,
+            # process tools are killed by the pool at the same deadline
+            future.cancel()
+            group_results.append(_timeout_error(tool))
+        except Exception as e:
+            group_results.append(e)
+    return _fan_out(groups, group_results, len(invocations))
+
+
+async def ainvoke_tools(invocations: list[tuple[LLMTool, dict]]) -> list:
+    # Returns the results in invocation order, with failed calls as their exceptions
+    groups = _group_invocations(invocations)
+
+    async def invoke(tool: LLMTool, indices: list[int]):
+        try:
+            # Coroutine and process tools are cancelled on timeout, blocking ones only abandoned
+            return await asyncio.wait_for(
+                _ainvoke_group(tool, [invocations[i][1] for i in indices]),
+                tool.timeout,
+            )
+        except asyncio.TimeoutError:
+            raise _timeout_error(tool)
+
+    group_results = await asyncio.gather(
+        *[invoke(tool, indices) for tool, indices in groups],
+        return_exceptions=True,
+    )
+    return _fan_out(groups, group_results, len(invocations))
+
+
+class SpeculativeToolCalls:
+    def __init__(self):
+        # Calls started while the response requesting them was still streaming: (tool, arguments, future, start)
+        self.calls = []
+
+    def start(self, tool: LLMTool, arguments: dict):
+        # Blocking agents run the call in the tool executor
+        future = get_tool_executor().submit(tool.invoke, **arguments)
+        self.calls.append((tool, arguments, future, time.monotonic()))
+
+    async def _ainvoke(self, tool: LLMTool, arguments: dict):
+        # The call is only created once the task runs, so discarding a task that never started leaves nothing behind
+        return await asyncio.wait_for(tool.ainvoke(**arguments), tool.timeout)
+
+    def astart(self, tool: LLMTool, arguments: dict):
+        # Async agents run the call as a task on the running event loop
+        task = asyncio.ensure_future(self._ainvoke(tool, arguments))
+        self.calls.append((tool, arguments, task, time.monotonic()))
+
+    def claim(self, tool: LLMTool, arguments: dict) -> tuple | None:
+        # The final parse confirms a started call by requesting the same tool with the same arguments
+        for i, call in enumerate(self.calls):
+            if call[0] is tool and call[1] == arguments:
+                return self.calls.pop(i)
+        return None
+
+    def result(self, call: tuple):
+        # The timeout counts from the moment the call was started
+        tool, _, future, start = call
+        timeout = (
+            None
+            if tool.timeout is None
+            else max(0.0, start + tool.timeout - time.monotonic())
+        )
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            return _timeout_error(tool)
+        except Exception as e:
+            return e
+
+    async def aresult(self, call: tuple):
+        tool, _, task, _ = call
+        try:
+            return await task
+        except asyncio.TimeoutError:
+            return _timeout_error(tool)
+        except Exception as e:
+            return e
+
+    def discard(self):
+        # Unconfirmed calls are cancelled if possible, their results are never used
+        for _, _, future, _ in self.calls:
+            future.cancel()
+        self.calls = []
@@ -0,0 +1,89 @@
+import heapq
+import math
+import re
+from collections import Counter
+
+from tool_use.llm_tool import LLMTool
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+STOP_WORDS = frozenset(
+    "a an and are as at be by for from in is it of on or the this to was what with".split()
+)
+
+
+def tokenize(text: str) -> list[str]:
+    # Splits snake_case names and prose alike, e.g. get_spot_price_func -> get, spot, price, func
+    return [
+        token
+        for token in TOKEN_PATTERN.findall(text.lower())
+        if token not in STOP_WORDS
+    ]
+
+
+class ToolIndex:
+    def __init__(self, tools: list[LLMTool] = (), k1: float = 1.5, b: float = 0.75):
+        # Okapi BM25 over tool names, descriptions and parameter names, fully local
+        self.k1 = k1
+        self.b = b
+        self._tools: dict[str, LLMTool] = {}
+        self._order: dict[str, int] = {}
+        self._lengths: dict[str, int] = {}
+        self._postings: dict[str, dict[str, int]] = {}
+        self._total_length = 0
+        for tool in tools:
+            self.add(tool)
+
+    def _tool_text(self, tool: LLMTool) -> str:
+        description = tool.json_schema["function"]["description"]
+        return " ".join([tool.name, description, *tool.parameters])
+
+    def add(self, tool: LLMTool):
+        if tool.name in self._tools:
+            self.remove(tool.name)
+        term_counts = Counter(tokenize(self._tool_text(tool)))
+        self._tools[tool.name] = tool
+        self._order.setdefault(tool.name, len(self._order))
+        self._lengths[tool.name] = sum(term_counts.values())
+        self._total_length += self._lengths[tool.name]
+        for term, count in term_counts.items():
+            self._postings.setdefault(term, {})[tool.name] = count
+
+    def remove(self, name: str):
+        self._tools.pop(name)
+        self._total_length -= self._lengths.pop(name)
+        for term in [t for t, docs in self._postings.items() if name in docs]:
+            del self._postings[term][name]
+            if not self._postings[term]:
+                del self._postings[term]
+
+    def __len__(self) -> int:
+        return len(self._tools)
+
+    def search(self, query: str, top_k: int) -> list[LLMTool]:
+        doc_count = len(self._tools)
+        if not doc_count:
+            return []
+        average_length = self._total_length / doc_count or 1.0
+        scores: dict[str, float] = {}
+        for term in set(tokenize(query)):
+            docs = self._postings.get(term)
+            if not docs:
+                continue
+            idf = math.log(1 + (doc_count - len(docs) + 0.5) / (len(docs) + 0.5))
+            for name, count in docs.items():
+                norm = self.k1 * (
+                    1 - self.b + self.b * self._lengths[name] / average_length
+                )
+                scores[name] = scores.get(name, 0.0) + idf * count * (self.k1 + 1) / (
+                    count + norm
+                )
+        best = heapq.nlargest(
+            top_k, scores, key=lambda name: (scores[name], -self._order[name])
+        )
+        # Pad with unmatched tools in registration order, so the selection size is stable
+        if len(best) < top_k:
+            chosen = set(best)
+            best += [name for name in self._tools if name not in chosen][
+                : top_k - len(best)
+            ]
+        return [self._tools[name] for name in best]
@@ -1,9 +1,20 @@
 from model.base_llm import BaseLLM
-from model.utils import create_message, add_message_to_history, TYPE_DICTIONARY
+from model.chat_history import ChatHistory
+from model.tokens import get_history_token_budget
+from model.utils import (
+    create_message,
+    TagStreamCollector,
+)
 
 from tool_use.llm_tool import LLMTool
+from tool_use.observation import ObservationFormatter
+from tool_use.tool_index import ToolIndex
+from tool_use.tool_executor import invoke_tools, ainvoke_tools
+from reason_and_act.json_repair import parse_json
+from reason_and_act.step_parser import STEP_CALL, parse_steps, step_contents
+from collections import OrderedDict
+import asyncio
 import json
-import re
 
 from tool_use.utils import (
     TOOLS_DEFINITIONS_TAG,
@@ -12,6 +23,8 @@ from tool_use.utils import (
     TOOLS_INVOCATIONS_TAG_END,
     TOOLS_RESULTS_TAG,
     TOOLS_RESULTS_TAG_END,
+    PROMPT_CACHE_SIZE,
+    compile_tool_definitions,
 )
 
 
@@ -20,10 +33,31 @@ class ToolUseAgent:
         self,
         llm: BaseLLM,
         tools: list[LLMTool],
+        stream: bool = False,
+        history_token_budget: int | None = None,
+        native_tools: bool = False,
+        max_prompt_tools: int | None = None,
+        observation_formatter: ObservationFormatter | None = None,
     ):
         self.llm = llm
-        self.tools = tools
-        self.tools_dict = {tool.name: tool for tool in tools}
+        # Native mode passes tools as JSON schemas and reads structured tool calls instead of XML tags
+        self.native_tools = native_tools
+        # With large registries only the tools most relevant to the query are put into the prompt
+        self.max_prompt_tools = max_prompt_tools
+        # Token budget for tool results kept in the prompt, defaults to the model budget
+        self.history_token_budget = history_token_budget or get_history_token_budget(
+            llm.model_name
+        )
+        # Keeps every function result within its token budget. The final answer follows the only round of calls,
+        # so a formatter with a blob store would point at results the model cannot read
+        self.observation_formatter = observation_formatter or ObservationFormatter(
+            model_name=llm.model_name
+        )
+        # Streaming stops the tool invocation response once the last consecutive function call is closed
+        self.stream = stream
+        self.stream_stop_tags = {TOOLS_INVOCATIONS_TAG_END: (TOOLS_INVOCATIONS_TAG,)}
+        # Function calls are the only steps of a tool use response
+        self.step_tags = {STEP_CALL: (TOOLS_INVOCATIONS_TAG, TOOLS_INVOCATIONS_TAG_END)}
         self.agent_system_prompt = f"""You are a function-calling AI model.
 Function signatures are provided within {TOOLS_DEFINITIONS_TAG}{TOOLS_DEFINITIONS_TAG_END} XML tags. Call one or more functions to assist with the user query without making assumptions about argument values.
 Pay close attention to the name and type of each parameter. Return each function call as a JSON object within {TOOLS_INVOCATIONS_TAG}{TOOLS_INVOCATIONS_TAG_END} XML tags, formatted as follows:
@@ -32,77 +66,223 @@ Pay close attention to the name and type of each parameter. Return each function
 {TOOLS_INVOCATIONS_TAG_END}
 
 Here are the available functions:
+"""
+        self.native_agent_system_prompt = """You are a function-calling AI model.
+Call one or more of the provided functions to assist with the user query without making assumptions about argument values.
 """
         self.tool_results_prompt = f"Always check if the function has already been called and the results are in the {TOOLS_RESULTS_TAG}{TOOLS_RESULTS_TAG_END} XML tags. If so, you must answer the user without referring to any functions!"
+        self.set_tools(tools)
+
+    def _extract_tool_calls(self, text: str) -> list[dict]:
+        # Single pass over the response, returns [] if there are no function calls
+        content = step_contents(parse_steps(text, self.step_tags), STEP_CALL)
+        return [json.loads(tc) for tc in content]
 
-    def _extract_tool_calls(self, text: str):
-        # Find content between the tags using regex
-        tag_pattern = rf"{TOOLS_INVOCATIONS_TAG}(.*?){TOOLS_INVOCATIONS_TAG_END}"
-        matched_contents = re.findall(tag_pattern, text, re.DOTALL)
-        # Strip leading and trailing whitespace or return "" if empty
-        content = [content.strip() for content in matched_contents]
-        return content if content else ""
-
-    def _convert_tool_arguments(self, tool_call: dict, tool_signature: dict) -> dict:
-        # Iterate over all arguments in tool call
-        for arg_name, arg_value in tool_call["arguments"].items():
-            param_type = tool_signature["parameters"][arg_name]
-            # Convert the argument value to the correct type if needed
-            if not isinstance(arg_value, TYPE_DICTIONARY[param_type]):
-                param_value = TYPE_DICTIONARY[param_type](arg_value)
-                tool_call["arguments"][arg_name] = param_value
-
-        return tool_call
-
-    def _handle_tool_calls(self, tool_calls: list) -> dict:
-        tool_results = {}
-        for tc in tool_calls:
-            tool_call_dict = json.loads(tc)
+    def _prepare_tool_calls(self, tool_calls: list[dict]) -> list[tuple[LLMTool, dict]]:
+        invocations = []
+        for tool_call_dict in tool_calls:
             # Get the tool from the dictionary
             tool = self.tools_dict[tool_call_dict["name"]]
             # Convert any arguments to the correct type
-            tool_call = self._convert_tool_arguments(
-                tool_call_dict, json.loads(tool.description)
+            invocations.append(
+                (tool, tool.coerce_arguments(tool_call_dict["arguments"]))
             )
-            # Invoke the tool using the tool call data
-            result = tool.invoke(**tool_call["arguments"])
-            # Store the result for the tool call
-            tool_results[tc] = result
+        return invocations
 
-        return tool_results
+    def _check_tool_results(self, results: list):
+        for result in results:
+            if isinstance(result, Exception):
+                raise result
 
-    def generate(self, user_msg: str) -> str:
-        tool_definitions = "\n".join(
-            [
-                TOOLS_DEFINITIONS_TAG,
-                ",\n\n".join(
-                    [
-                        tool.description.encode().decode("unicode_escape")
-                        for tool in self.tools
-                    ]
-                ),
-                TOOLS_DEFINITIONS_TAG_END,
+    def _tool_call_label(self, tool_call_dict: dict) -> str:
+        return json.dumps(
+            {"name": tool_call_dict["name"], "arguments": tool_call_dict["arguments"]},
+            default=str,
+        )
+
+    def _handle_tool_calls(self, tool_calls: list[dict]) -> dict:
+        # Invoke all tools of the response concurrently
+        invocations = self._prepare_tool_calls(tool_calls)
+        results = invoke_tools(invocations)
+        self._check_tool_results(results)
+        # Store the result for the tool call, cut down to its budget
+        return {
+            self._tool_call_label(tool_call_dict): self.observation_formatter.format(
+                tool, arguments, result
+            )
+            for tool_call_dict, (tool, arguments), result in zip(
+                tool_calls, invocations, results
+            )
+        }
+
+    async def _ahandle_tool_calls(self, tool_calls: list[dict]) -> dict:
+        # Invoke all tools of the response concurrently
+        invocations = self._prepare_tool_calls(tool_calls)
+        results = await ainvoke_tools(invocations)
+        self._check_tool_results(results)
+        # Store the result for the tool call, oversized ones are summarized concurrently
+        observations = await asyncio.gather(
+            *[
+                self.observation_formatter.aformat(tool, arguments, result)
+                for (tool, arguments), result in zip(invocations, results)
             ]
         )
-        # Assemble the full prompt
-        complete_tool_agent_prompt = f"{self.agent_system_prompt}\n{tool_definitions}\n{self.tool_results_prompt}"
-        # Initialize the chat history with tool definitions
-        tool_chat_history = [
+        return dict(zip([self._tool_call_label(tc) for tc in tool_calls], observations))
+
+    def _compile_prompt(self, tools: tuple[LLMTool, ...]) -> tuple[dict, list[dict]]:
+        # Assemble the full prompt once per tool selection, it is identical for every session using it
+        if self.native_tools:
+            # Tool definitions travel as JSON schemas, so the prompt skips them
+            complete_tool_agent_prompt = (
+                f"{self.native_agent_system_prompt}\n{self.tool_results_prompt}"
+            )
+        else:
+            complete_tool_agent_prompt = f"{self.agent_system_prompt}\n{compile_tool_definitions(tools)}\n{self.tool_results_prompt}"
+        return (
             create_message(complete_tool_agent_prompt, "system"),
-            create_message(user_msg, "user"),
-        ]
-        # Generate a response (with tool invocations)
-        tool_call_response = self.llm.generate(tool_chat_history)
+            [tool.json_schema for tool in tools],
+        )
+
+    def _compile_prompts(self):
+        self._prompt_cache = OrderedDict()
+        self.system_message, self.tool_schemas = self._compile_prompt(self.tools)
+
+    def _select_prompt(self, user_msg: str) -> tuple[dict, list[dict]]:
+        if self.max_prompt_tools is None or len(self.tools) <= self.max_prompt_tools:
+            return self.system_message, self.tool_schemas
+        selected = self.tool_index.search(user_msg, self.max_prompt_tools)
+        # Registration order keeps the prompt byte-stable for the same selection
+        selected_names = {tool.name for tool in selected}
+        tools = tuple(tool for tool in self.tools if tool.name in selected_names)
+        key = tuple(tool.name for tool in tools)
+        if key not in self._prompt_cache:
+            self._prompt_cache[key] = self._compile_prompt(tools)
+            if len(self._prompt_cache) > PROMPT_CACHE_SIZE:
+                self._prompt_cache.popitem(last=False)
+        self._prompt_cache.move_to_end(key)
+        return self._prompt_cache[key]
+
+    def set_tools(self, tools: list[LLMTool]):
+        self.tools = tuple(tools)
+        self.tools_dict = {tool.name: tool for tool in self.tools}
+        self.tool_index = ToolIndex(self.tools)
+        self._compile_prompts()
+
+    def add_tools(self, tools: list[LLMTool]):
+        self.tools = (*self.tools, *tools)
+        for tool in tools:
+            self.tools_dict[tool.name] = tool
+            # Only the new tools are indexed
+            self.tool_index.add(tool)
+        self._compile_prompts()
+
+    def _init_chat_history(self, user_msg: str, system_message: dict) -> ChatHistory:
+        # Pin the shared system message and the user query, so token windowing never evicts the question
+        tool_chat_history = ChatHistory(
+            2, 100, self.history_token_budget, self.llm.model_name
+        )
+        tool_chat_history.add(system_message)
+        tool_chat_history.add(create_message(user_msg, "user"))
+        return tool_chat_history
+
+    def _generate_tool_calls(self, tool_chat_history: ChatHistory) -> str:
+        if not self.stream:
+            return self.llm.generate(tool_chat_history.to_messages())
+        collector = TagStreamCollector(self.stream_stop_tags)
+        chunks = self.llm.generate_stream(tool_chat_history.to_messages())
+        try:
+            for chunk in chunks:
+                if collector.feed(chunk):
+                    break
+        finally:
+            # Closing the stream early cancels the upstream request
+            chunks.close()
+        return collector.result()
+
+    async def _agenerate_tool_calls(self, tool_chat_history: ChatHistory) -> str:
+        if not self.stream:
+            return await self.llm.agenerate(tool_chat_history.to_messages())
+        collector = TagStreamCollector(self.stream_stop_tags)
+        chunks = self.llm.agenerate_stream(tool_chat_history.to_messages())
+        try:
+            async for chunk in chunks:
+                if collector.feed(chunk):
+                    break
+        finally:
+            # Closing the stream early cancels the upstream request
+            await chunks.aclose()
+        return collector.result()
+
+    def _parse_native_tool_calls(self, tool_calls: list[dict]) -> list[dict]:
+        # Same dicts as the XML mode function calls, malformed argument strings are repaired in one pass
+        tool_call_dicts = []
+        for tool_call in tool_calls:
+            raw_arguments = tool_call["arguments"] or ""
+            arguments = parse_json(raw_arguments) if raw_arguments.strip() else {}
+            if not isinstance(arguments, dict):
+                raise Exception(
+                    f"Function {tool_call['name']} was called with arguments that are not a JSON object: {raw_arguments}"
+                )
+            tool_call_dicts.append({"name": tool_call["name"], "arguments": arguments})
+        return tool_call_dicts
+
+    def _request_tool_calls(
+        self, tool_chat_history: ChatHistory, tool_schemas: list[dict]
+    ) -> list[dict]:
+        if self.native_tools:
+            _, tool_calls = self.llm.generate_tool_calls(
+                tool_chat_history.to_messages(), tool_schemas
+            )
+            return self._parse_native_tool_calls(tool_calls)
+        tool_call_response = self._generate_tool_calls(tool_chat_history)
         # Find tool calls
-        content = self._extract_tool_calls(tool_call_response)
+        return self._extract_tool_calls(tool_call_response)
+
+    async def _arequest_tool_calls(
+        self, tool_chat_history: ChatHistory, tool_schemas: list[dict]
+    ) -> list[dict]:
+        if self.native_tools:
+            _, tool_calls = await self.llm.agenerate_tool_calls(
+                tool_chat_history.to_messages(), tool_schemas
+            )
+            return self._parse_native_tool_calls(tool_calls)
+        tool_call_response = await self._agenerate_tool_calls(tool_chat_history)
+        # Find tool calls
+        return self._extract_tool_calls(tool_call_response)
+
+    def _add_tool_results(self, tool_chat_history: ChatHistory, tool_results: dict):
+        # One function call and its result per line instead of the escaped dict repr
+        tool_results_text = "\n".join(
+            f"{tool_call}: {result}" for tool_call, result in tool_results.items()
+        )
+        tool_message = create_message(
+            f"{TOOLS_RESULTS_TAG}\n{tool_results_text}\n{TOOLS_RESULTS_TAG_END}",
+            "assistant",
+        )
+        tool_chat_history.add(tool_message)
+
+    def generate(self, user_msg: str) -> str:
+        system_message, tool_schemas = self._select_prompt(user_msg)
+        tool_chat_history = self._init_chat_history(user_msg, system_message)
+        # Generate a response (with tool invocations)
+        content = self._request_tool_calls(tool_chat_history, tool_schemas)
         # Handle tool calls
         if content:
             tool_results = self._handle_tool_calls(content)
-            tool_message = create_message(
-                f"{TOOLS_RESULTS_TAG}\n{tool_results}\n{TOOLS_RESULTS_TAG_END}",
-                "assistant",
-            )
-            add_message_to_history(tool_chat_history, tool_message, 1, 100)
+            self._add_tool_results(tool_chat_history, tool_results)
+        # Generate a final response based on the additional information from the tool call
+        final_response = self.llm.generate(tool_chat_history.to_messages())
+        return final_response
+
+    async def agenerate(self, user_msg: str) -> str:
+        system_message, tool_schemas = self._select_prompt(user_msg)
+        tool_chat_history = self._init_chat_history(user_msg, system_message)
+        # Generate a response (with tool invocations) without blocking the event loop
+        content = await self._arequest_tool_calls(tool_chat_history, tool_schemas)
+        # Handle tool calls
+        if content:
+            tool_results = await self._ahandle_tool_calls(content)
+            self._add_tool_results(tool_chat_history, tool_results)
         # Generate a final response based on the additional information from the tool call
-        final_response = self.llm.generate(tool_chat_history)
+        final_response = await self.llm.agenerate(tool_chat_history.to_messages())
         return final_response
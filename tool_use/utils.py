@@ -1,6 +1,53 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
 TOOLS_INVOCATIONS_TAG = "<function_call>"
 TOOLS_INVOCATIONS_TAG_END = "</function_call>"
 TOOLS_DEFINITIONS_TAG = "<functions>"
 TOOLS_DEFINITIONS_TAG_END = "</functions>"
 TOOLS_RESULTS_TAG = "<function_results>"
 TOOLS_RESULTS_TAG_END = "</function_results>"
+
+# Compiled system prompts kept per agent for distinct relevance-ranked tool selections
+PROMPT_CACHE_SIZE = 64
+
+# JSON Schema for the annotated parameter types of native function calling tools
+JSON_SCHEMA_TYPES = {
+    "bool": {"type": "boolean"},
+    "int": {"type": "integer"},
+    "float": {"type": "number"},
+    "str": {"type": "string"},
+    "date": {"type": "string", "format": "date"},
+    "datetime": {"type": "string", "format": "date-time"},
+    "list": {"type": "array"},
+    "dict": {"type": "object"},
+}
+
+
+def compile_tool_definitions(tools: list) -> str:
+    # Deterministic rendering, so the same tools always produce byte-identical prompts
+    return "\n".join(
+        [
+            TOOLS_DEFINITIONS_TAG,
+            ",\n\n".join(
+                [tool.description.encode().decode("unicode_escape") for tool in tools]
+            ),
+            TOOLS_DEFINITIONS_TAG_END,
+        ]
+    )
+
+
+# Shared by every agent in the process, so concurrent sessions do not each spawn their own threads
+MAX_TOOL_WORKERS = 32
+_executor: ThreadPoolExecutor | None = None
+_executor_lock = threading.Lock()
+
+
+def get_tool_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=MAX_TOOL_WORKERS, thread_name_prefix="llm_tool"
+            )
+        return _executor